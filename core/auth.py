@@ -1,11 +1,16 @@
 from datetime import datetime, timedelta
 from typing import Optional, Tuple, Dict, Any
-from jose import JWTError, jwt
+from jose import ExpiredSignatureError, JWTError, jwk, jwt
 from passlib.context import CryptContext
 import os
+import json
+import time
+import base64
+import asyncio
 import logging
 from models import User, UserCreate, AccessToken
 from core.database import get_db
+from core.cache import TTLCache
 from bson.objectid import ObjectId
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer
@@ -16,20 +21,111 @@ logger = logging.getLogger(__name__)
 # Security settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
+
+# Signing key built once; jose otherwise constructs it on every encode and decode
+_JWT_KEY = jwk.construct(SECRET_KEY, ALGORITHM)
 ACCESS_TOKEN_EXPIRE_HOURS = 24  # Changed from 30 minutes to 24 hours
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-# Password hashing settings
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Stored user fields exposed through the User model
+_USER_PROJECTION = {
+    "email": 1,
+    "username": 1,
+    "onboarding": 1,
+    "created_at": 1,
+    "updated_at": 1
+}
+
+# User fields needed to check a password and build the login response
+_LOGIN_PROJECTION = {**_USER_PROJECTION, "password": 1}
+
+# Upper bound for keeping a verified token payload in memory
+TOKEN_CACHE_TTL = 300
+
+# Password hashing settings. New hashes use Argon2id; bcrypt hashes of
+# existing users still verify and are upgraded on their next login.
+# Memory cost (KiB) is paid per concurrent hash, so keep it modest.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 2))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 19456))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=1,
+    bcrypt__rounds=BCRYPT_ROUNDS
+)
+
+# Hash with the configured cost that no real password verifies against
+_DUMMY_PASSWORD_HASH = pwd_context.hash(os.urandom(16).hex())
 
 # HTTPBearer initialization
 security = HTTPBearer()
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+# Verified token payloads by raw token; invalid tokens are never stored
+_token_cache = TTLCache(ttl=TOKEN_CACHE_TTL, maxsize=10_000)
+
+# User IDs recently confirmed to exist when refreshing tokens; users are
+# never deleted, so entries only need to expire to bound memory
+_user_exists_cache = TTLCache(ttl=60, maxsize=10_000)
+
+# Password hashing is deliberately slow and releases the GIL, so it runs in
+# worker threads instead of blocking the event loop for every signup and login
+async def get_password_hash(password: str) -> str:
+    return await asyncio.to_thread(pwd_context.hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify password against its hash.
+    
+    Returns:
+        Tuple (is_valid, new_hash); new_hash is set when the stored hash
+        uses a deprecated scheme or settings and should be replaced
+    """
+    return await asyncio.to_thread(pwd_context.verify_and_update, plain_password, hashed_password)
+
+def _peek_exp(token: str) -> Optional[float]:
+    """
+    Read exp claim without verifying the token.
+    Only used to reject expired tokens early; returns None when the
+    claim cannot be read, leaving the error to full verification.
+    """
+    try:
+        segment = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+        exp = claims.get("exp")
+        return float(exp) if isinstance(exp, (int, float)) else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def decode_token(token: str) -> Dict[str, Any]:
+    """
+    Verify token signature and expiry and return its payload.
+    Payloads are cached until the token expires (at most TOKEN_CACHE_TTL),
+    so a token reused across requests is verified once.
+    
+    Args:
+        token: Encoded JWT
+        
+    Returns:
+        Token payload
+        
+    Raises:
+        JWTError: If the token is invalid or expired
+    """
+    payload = _token_cache.get(token)
+    if payload is None:
+        # Stale tokens are rejected without the signature check
+        exp = _peek_exp(token)
+        if exp is not None and exp <= time.time():
+            raise ExpiredSignatureError("Signature has expired.")
+        payload = jwt.decode(token, _JWT_KEY, algorithms=[ALGORITHM])
+        ttl = min(payload.get("exp", 0) - time.time(), TOKEN_CACHE_TTL)
+        if ttl > 0:
+            _token_cache.set(token, payload, ttl)
+    return payload
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -38,44 +134,80 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _JWT_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def create_refresh_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _JWT_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _user_from_doc(doc: Dict[str, Any]) -> User:
+    """Build User from a stored document, skipping Pydantic validation"""
+    return User.model_construct(
+        id=str(doc["_id"]),
+        email=doc["email"],
+        username=doc.get("username"),
+        onboarding=doc.get("onboarding", False),
+        created_at=doc.get("created_at") or datetime.utcnow(),
+        updated_at=doc.get("updated_at") or datetime.utcnow()
+    )
+
+async def _find_taken_login(db, email: Optional[str], username: Optional[str]) -> Optional[str]:
+    """
+    Check email and username against existing users in a single query.
+    
+    Args:
+        db: Database instance
+        email: Email to check
+        username: Optional username to check
+        
+    Returns:
+        Conflict message (email is reported first) or None if both are free
+    """
+    conditions = []
+    if email:
+        conditions.append({"email": email})
+    if username:
+        conditions.append({"username": username})
+    if not conditions:
+        return None
+    
+    # At most one user can match each field
+    users = await db.users.find(
+        {"$or": conditions},
+        {"_id": 0, "email": 1, "username": 1}
+    ).to_list(length=2)
+    if email and any(user.get("email") == email for user in users):
+        return "Email already registered"
+    if username and any(user.get("username") == username for user in users):
+        return "Username already taken"
+    return None
+
 async def create_user(user: UserCreate) -> User:
     """Create a new user"""
     db = get_db()
     
-    # Check if user with this email exists
-    if await db.users.find_one({"email": user.email}):
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Email already registered"
-        )
-    
-    # Check if user with this username exists (if provided)
-    if user.username and await db.users.find_one({"username": user.username}):
+    # Check that email and username (if provided) are not taken
+    conflict = await _find_taken_login(db, user.email, user.username)
+    if conflict:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
-            detail="Username already taken"
+            detail=conflict
         )
     
     try:
         # Create new user
-        hashed_password = get_password_hash(user.password)
-        user_dict = user.dict()
+        hashed_password = await get_password_hash(user.password)
+        user_dict = user.model_dump()
         user_dict["password"] = hashed_password
         user_dict["created_at"] = datetime.utcnow()
         
-        result = await db.users.insert_one(user_dict)
-        user_dict["id"] = str(result.inserted_id)
-        return User(**user_dict)
+        # insert_one completes the written data with the new _id
+        await db.users.insert_one(user_dict)
+        return _user_from_doc(user_dict)
     except Exception as e:
         logger.error(f"Error creating user: {str(e)}")
         raise HTTPException(
@@ -94,33 +226,24 @@ async def authenticate_user(login: str, password: str) -> Optional[User]:
                 {"email": login},
                 {"username": login}
             ]
-        })
+        }, _LOGIN_PROJECTION)
         
-        if not user:
+        # Unknown logins are checked against a dummy hash, so the response
+        # time does not reveal which emails and usernames are registered
+        password_hash = user["password"] if user else _DUMMY_PASSWORD_HASH
+        is_valid, new_hash = await verify_password(password, password_hash)
+        if not is_valid or not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect login or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        if not verify_password(password, user["password"]):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect login or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # Convert ObjectId to string for id and prepare user data
-        user_data = {
-            "id": str(user["_id"]),
-            "email": user["email"],
-            "username": user.get("username"),
-            "onboarding": user.get("onboarding", False),
-            "created_at": user.get("created_at", datetime.utcnow()),
-            "updated_at": user.get("updated_at", datetime.utcnow())
-        }
+        # Upgrade legacy hashes while the plain password is at hand
+        if new_hash:
+            await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
         
-        return User(**user_data)
+        return _user_from_doc(user)
     except HTTPException:
         raise
     except Exception as e:
@@ -138,7 +261,7 @@ async def get_current_user(token: str = Depends(security)) -> User:
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token.credentials)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
@@ -149,20 +272,13 @@ async def get_current_user(token: str = Depends(security)) -> User:
     db = get_db()
     try:
         # Convert string ID to ObjectId
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, _USER_PROJECTION)
         if user is None:
             raise credentials_exception
         
-        # Convert ObjectId to string for id
-        user["id"] = str(user["_id"])
-        # Remove _id as it's not needed in the model
-        del user["_id"]
-        
-        # Ensure onboarding field exists
-        if "onboarding" not in user:
-            user["onboarding"] = False
-            
-        return User(**user)
+        # Runs on every authenticated request, so the trusted document
+        # is not validated again
+        return _user_from_doc(user)
     except Exception as e:
         logger.error(f"Error getting user: {str(e)}")
         raise credentials_exception
@@ -170,7 +286,7 @@ async def get_current_user(token: str = Depends(security)) -> User:
 async def refresh_access_token(refresh_token: str) -> str:
     """Refresh access token using refresh token"""
     try:
-        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(refresh_token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(
@@ -179,15 +295,16 @@ async def refresh_access_token(refresh_token: str) -> str:
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        db = get_db()
-        # Check if user exists
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        # Check if user exists; recently confirmed users skip the lookup
+        if not _user_exists_cache.get(user_id):
+            db = get_db()
+            if await db.users.find_one({"_id": ObjectId(user_id)}, {"_id": 1}) is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="User not found",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            _user_exists_cache.set(user_id, True)
         
         # Create new access token
         access_token_expires = timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
@@ -230,30 +347,17 @@ async def check_availability(email: Optional[str] = None, username: Optional[str
                 "message": "No email or username provided"
             }
             
-        result = {
+        conflict = await _find_taken_login(db, email, username)
+        if conflict:
+            return {
+                "is_available": False,
+                "message": conflict
+            }
+        
+        return {
             "is_available": True,
             "message": "Available"
         }
-        
-        # Проверяем email, если он предоставлен
-        if email:
-            email_exists = await db.users.find_one({"email": email})
-            if email_exists:
-                return {
-                    "is_available": False,
-                    "message": "Email already registered"
-                }
-        
-        # Проверяем username, если он предоставлен
-        if username:
-            username_exists = await db.users.find_one({"username": username})
-            if username_exists:
-                return {
-                    "is_available": False,
-                    "message": "Username already taken"
-                }
-        
-        return result
     except Exception as e:
         logger.error(f"Error checking availability: {str(e)}")
         raise HTTPException(
@@ -2,16 +2,43 @@ import os
 import json
 import logging
 import httpx
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from fastapi import HTTPException
 import base64
 from httpx import Timeout, Limits
 import asyncio
 import time
+from functools import lru_cache
 from models.job_queries import JobQueryKeywords
 
 logger = logging.getLogger(__name__)
 
+# Small fast model for short structured outputs such as job search keywords
+KEYWORDS_MODEL = "claude-haiku-4-5"
+KEYWORDS_MAX_TOKENS = 256
+KEYWORDS_TEMPERATURE = 0.2
+
+# Static instructions for keyword generation. Sent as a cached system prompt
+# so that only the candidate data varies between requests.
+JOB_QUERY_KEYWORDS_INSTRUCTIONS = """Based on the candidate data provided by the user, generate job search keywords.
+For each category, provide exactly 2 words or phrases that would be most relevant for job search.
+
+Categories:
+- job_titles: Desired job titles
+- required_skills: Key skills to look for
+- work_arrangements: Preferred work arrangements
+- positions: Desired positions/levels
+- exclude_words: Words to exclude from search
+
+Return the response in JSON format with the following structure:
+{
+    "job_titles": ["word1", "word2"],
+    "required_skills": ["word1", "word2"],
+    "work_arrangements": ["word1", "word2"],
+    "positions": ["word1", "word2"],
+    "exclude_words": ["word1", "word2"]
+}"""
+
 class ClaudeClient:
     def __init__(self):
         self.api_key = os.getenv("CLAUDE_API_KEY")
@@ -32,10 +59,29 @@ class ClaudeClient:
             write=10.0,    # Write timeout
             pool=10.0      # Pool connection acquisition timeout
         )
+        # Sized for one client shared by all requests
         self.limits = Limits(
-            max_keepalive_connections=5,
-            max_connections=10
+            max_keepalive_connections=20,
+            max_connections=50,
+            keepalive_expiry=30.0
         )
+        self._http_client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Shared HTTP client, so keep-alive connections are reused between requests"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits
+            )
+        return self._http_client
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP client"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
         
     async def analyze_text(self, text: str, prompt: str) -> Dict[str, Any]:
         """
@@ -50,46 +96,145 @@ class ClaudeClient:
         """
         start_time = time.time()
         try:
-            async with httpx.AsyncClient(
-                timeout=self.timeout,
-                limits=self.limits
-            ) as client:
-                logger.info(f"Sending request to Claude API (text length: {len(text)} characters)")
-                response = await client.post(
-                    f"{self.base_url}/messages",
-                    headers=self.headers,
-                    json={
-                        "model": "claude-3-7-sonnet-20250219",
-                        "max_tokens": 4000,
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": f"{prompt}\n\nText to analyze:\n{text}"
-                            }
-                        ]
-                    }
+            client = self.http_client
+            logger.info(f"Sending request to Claude API (text length: {len(text)} characters)")
+            response = await client.post(
+                f"{self.base_url}/messages",
+                headers=self.headers,
+                json={
+                    "model": "claude-3-7-sonnet-20250219",
+                    "max_tokens": 4000,
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": f"{prompt}\n\nText to analyze:\n{text}"
+                        }
+                    ]
+                }
+            )
+            
+            elapsed_time = time.time() - start_time
+            logger.info(f"Claude API request completed in {elapsed_time:.2f} seconds")
+            
+            if response.status_code != 200:
+                logger.error(f"Claude API error (HTTP {response.status_code}): {response.text}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Error analyzing text: {response.text}"
                 )
-                
-                elapsed_time = time.time() - start_time
-                logger.info(f"Claude API request completed in {elapsed_time:.2f} seconds")
-                
+            
+            result = response.json()
+            logger.debug(f"Response from Claude API: {json.dumps(result, ensure_ascii=False)}")
+            return result
+            
+        except httpx.TimeoutException as e:
+            logger.error(f"Timeout in Claude API request: {str(e)}")
+            raise HTTPException(
+                status_code=504,
+                detail="API request timeout"
+            )
+        except Exception as e:
+            logger.error(f"Error in Claude API request: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error analyzing text: {str(e)}"
+            )
+            
+    async def stream_json_message(
+        self,
+        system: str,
+        text: str,
+        model: str = "claude-3-7-sonnet-20250219",
+        max_tokens: int = 4000,
+        temperature: float = 1.0
+    ) -> str:
+        """
+        Stream a response from Claude API and stop as soon as it contains a complete JSON object.
+        The system prompt is marked for prompt caching.
+        
+        Args:
+            system: Static instructions, marked for prompt caching
+            text: Variable user content
+            model: Model name
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            
+        Returns:
+            JSON object text
+        """
+        start_time = time.time()
+        try:
+            client = self.http_client
+            logger.info(f"Streaming request to Claude API (text length: {len(text)} characters)")
+            async with client.stream(
+                "POST",
+                f"{self.base_url}/messages",
+                headers=self.headers,
+                json={
+                    "model": model,
+                    "max_tokens": max_tokens,
+                    "temperature": temperature,
+                    "stream": True,
+                    "system": [
+                        {
+                            "type": "text",
+                            "text": system,
+                            "cache_control": {"type": "ephemeral"}
+                        }
+                    ],
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": text
+                        }
+                    ]
+                }
+            ) as response:
                 if response.status_code != 200:
+                    await response.aread()
                     logger.error(f"Claude API error (HTTP {response.status_code}): {response.text}")
                     raise HTTPException(
                         status_code=500,
                         detail=f"Error analyzing text: {response.text}"
                     )
                 
-                result = response.json()
-                logger.debug(f"Response from Claude API: {json.dumps(result, ensure_ascii=False)}")
-                return result
+                content = ""
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[5:])
+                    if event.get("type") == "error":
+                        raise ValueError(f"Claude API stream error: {event.get('error')}")
+                    if event.get("type") != "content_block_delta" or event["delta"].get("type") != "text_delta":
+                        continue
+                    
+                    content += event["delta"]["text"]
+                    if "}" not in event["delta"]["text"]:
+                        continue
+                    
+                    # Stop reading once the JSON object is complete; closing the
+                    # stream early drops the rest of the generation
+                    start = content.find("{")
+                    end = content.rfind("}") + 1
+                    try:
+                        json.loads(content[start:end])
+                    except ValueError:
+                        continue
+                    
+                    elapsed_time = time.time() - start_time
+                    logger.info(f"Claude API JSON received in {elapsed_time:.2f} seconds")
+                    return content[start:end]
                 
+                raise ValueError("Could not find JSON in response")
+            
         except httpx.TimeoutException as e:
             logger.error(f"Timeout in Claude API request: {str(e)}")
             raise HTTPException(
                 status_code=504,
                 detail="API request timeout"
             )
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error in Claude API request: {str(e)}")
             raise HTTPException(
@@ -162,73 +307,71 @@ class ClaudeClient:
             if not mime_type:
                 raise ValueError(f"Unsupported file format: {file_extension}")
 
-            # Encode file in base64
-            file_base64 = base64.b64encode(file_content).decode('utf-8')
+            # Encode file in base64 off the event loop; large files take a while
+            file_base64 = (await asyncio.to_thread(base64.b64encode, file_content)).decode('ascii')
             logger.info(f"File encoded in base64 (size: {len(file_base64)} characters)")
             
             # Create HTTP client with settings
-            async with httpx.AsyncClient(
-                timeout=self.timeout,
-                limits=self.limits
-            ) as client:
-                for attempt in range(3):  # Maximum 3 attempts
-                    try:
-                        logger.info(f"Attempt {attempt + 1} of 3")
-                        response = await client.post(
-                            f"{self.base_url}/messages",
-                            headers=self.headers,
-                            json={
-                                "model": "claude-3-7-sonnet-20250219",
-                                "max_tokens": 4000,
-                                "messages": [
-                                    {
-                                        "role": "user",
-                                        "content": [
-                                            {
-                                                "type": "text",
-                                                "text": prompt
-                                            },
-                                            {
-                                                "type": "document",
-                                                "source": {
-                                                    "type": "base64",
-                                                    "media_type": mime_type,
-                                                    "data": file_base64
-                                                }
+            client = self.http_client
+            for attempt in range(3):  # Maximum 3 attempts
+                try:
+                    logger.info(f"Attempt {attempt + 1} of 3")
+                    response = await client.post(
+                        f"{self.base_url}/messages",
+                        headers=self.headers,
+                        json={
+                            "model": "claude-3-7-sonnet-20250219",
+                            "max_tokens": 4000,
+                            "messages": [
+                                {
+                                    "role": "user",
+                                    "content": [
+                                        {
+                                            "type": "text",
+                                            "text": prompt
+                                        },
+                                        {
+                                            "type": "document",
+                                            "source": {
+                                                "type": "base64",
+                                                "media_type": mime_type,
+                                                "data": file_base64
                                             }
-                                        ]
-                                    }
-                                ]
-                            }
-                        )
-                        
-                        if response.status_code == 200:
-                            break
-                        elif response.status_code == 429:  # Rate limit
-                            if attempt < 2:  # Don't sleep on last attempt
-                                await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                                continue
-                        
-                        logger.error(f"Claude API error (HTTP {response.status_code}): {response.text}")
-                        raise HTTPException(
-                            status_code=500,
-                            detail=f"Error analyzing file: {response.text}"
-                        )
-                        
-                    except Exception as e:
-                        if attempt < 2:
-                            logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
-                            await asyncio.sleep(2 ** attempt)
+                                        }
+                                    ]
+                                }
+                            ]
+                        }
+                    )
+                    
+                    if response.status_code == 200:
+                        break
+                    elif response.status_code == 429:  # Rate limit
+                        if attempt < 2:  # Don't sleep on last attempt
+                            await asyncio.sleep(2 ** attempt)  # Exponential backoff
                             continue
-                        raise
-                        
-                elapsed_time = time.time() - start_time
-                logger.info(f"Claude API request completed in {elapsed_time:.2f} seconds")
-                
-                result = response.json()
+                    
+                    logger.error(f"Claude API error (HTTP {response.status_code}): {response.text}")
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Error analyzing file: {response.text}"
+                    )
+                    
+                except Exception as e:
+                    if attempt < 2:
+                        logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    raise
+                    
+            elapsed_time = time.time() - start_time
+            logger.info(f"Claude API request completed in {elapsed_time:.2f} seconds")
+            
+            result = response.json()
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(f"Response from Claude API: {json.dumps(result, ensure_ascii=False)}")
-                return result
-                
+            return result
+            
         except httpx.TimeoutException as e:
             logger.error(f"Timeout in Claude API request: {str(e)}")
             raise HTTPException(
@@ -301,47 +444,44 @@ class ClaudeClient:
                 6. Return ONLY the generated text without any additional comments, explanations, or notes
                 """
 
-            async with httpx.AsyncClient(
-                timeout=self.timeout,
-                limits=self.limits
-            ) as client:
-                logger.info(f"Sending request to Claude API for generating {content_type}")
-                response = await client.post(
-                    f"{self.base_url}/messages",
-                    headers=self.headers,
-                    json={
-                        "model": "claude-3-7-sonnet-20250219",
-                        "max_tokens": 4000,
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": system_prompt
-                            }
-                        ]
-                    }
+            client = self.http_client
+            logger.info(f"Sending request to Claude API for generating {content_type}")
+            response = await client.post(
+                f"{self.base_url}/messages",
+                headers=self.headers,
+                json={
+                    "model": "claude-3-7-sonnet-20250219",
+                    "max_tokens": 4000,
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": system_prompt
+                        }
+                    ]
+                }
+            )
+            
+            elapsed_time = time.time() - start_time
+            logger.info(f"Claude API request completed in {elapsed_time:.2f} seconds")
+            
+            if response.status_code != 200:
+                logger.error(f"Claude API error (HTTP {response.status_code}): {response.text}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Error generating text: {response.text}"
                 )
-                
-                elapsed_time = time.time() - start_time
-                logger.info(f"Claude API request completed in {elapsed_time:.2f} seconds")
-                
-                if response.status_code != 200:
-                    logger.error(f"Claude API error (HTTP {response.status_code}): {response.text}")
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Error generating text: {response.text}"
-                    )
-                
-                result = response.json()
-                generated_text = result.get("content", [{}])[0].get("text", "")
-                
-                if not generated_text:
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Failed to generate text"
-                    )
-                
-                return generated_text
-                
+            
+            result = response.json()
+            generated_text = result.get("content", [{}])[0].get("text", "")
+            
+            if not generated_text:
+                raise HTTPException(
+                    status_code=500,
+                    detail="Failed to generate text"
+                )
+            
+            return generated_text
+            
         except httpx.TimeoutException as e:
             logger.error(f"Timeout while requesting Claude API: {str(e)}")
             raise HTTPException(
@@ -391,47 +531,44 @@ class ClaudeClient:
                 6. Make sure all placeholders are replaced with meaningful content
                 """
 
-            async with httpx.AsyncClient(
-                timeout=self.timeout,
-                limits=self.limits
-            ) as client:
-                logger.info("Sending request to Claude API for rendering cover letter")
-                response = await client.post(
-                    f"{self.base_url}/messages",
-                    headers=self.headers,
-                    json={
-                        "model": "claude-3-7-sonnet-20250219",
-                        "max_tokens": 4000,
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": system_prompt
-                            }
-                        ]
-                    }
+            client = self.http_client
+            logger.info("Sending request to Claude API for rendering cover letter")
+            response = await client.post(
+                f"{self.base_url}/messages",
+                headers=self.headers,
+                json={
+                    "model": "claude-3-7-sonnet-20250219",
+                    "max_tokens": 4000,
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": system_prompt
+                        }
+                    ]
+                }
+            )
+            
+            elapsed_time = time.time() - start_time
+            logger.info(f"Claude API request completed in {elapsed_time:.2f} seconds")
+            
+            if response.status_code != 200:
+                logger.error(f"Claude API error (HTTP {response.status_code}): {response.text}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Error rendering text: {response.text}"
                 )
-                
-                elapsed_time = time.time() - start_time
-                logger.info(f"Claude API request completed in {elapsed_time:.2f} seconds")
-                
-                if response.status_code != 200:
-                    logger.error(f"Claude API error (HTTP {response.status_code}): {response.text}")
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Error rendering text: {response.text}"
-                    )
-                
-                result = response.json()
-                rendered_text = result.get("content", [{}])[0].get("text", "")
-                
-                if not rendered_text:
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Failed to render text"
-                    )
-                
-                return rendered_text
-                
+            
+            result = response.json()
+            rendered_text = result.get("content", [{}])[0].get("text", "")
+            
+            if not rendered_text:
+                raise HTTPException(
+                    status_code=500,
+                    detail="Failed to render text"
+                )
+            
+            return rendered_text
+            
         except httpx.TimeoutException as e:
             logger.error(f"Timeout while requesting Claude API: {str(e)}")
             raise HTTPException(
@@ -548,46 +685,16 @@ class ClaudeClient:
         Returns:
             JobQueryKeywords object with generated keywords
         """
-        prompt = f"""
-        Based on the following candidate data, generate job search keywords.
-        For each category, provide exactly 2 words or phrases that would be most relevant for job search.
-        
-        Categories:
-        - job_titles: Desired job titles
-        - required_skills: Key skills to look for
-        - work_arrangements: Preferred work arrangements
-        - positions: Desired positions/levels
-        - exclude_words: Words to exclude from search
-        
-        Candidate data:
-        {json.dumps(candidate_data, indent=2, ensure_ascii=False)}
-        
-        Return the response in JSON format with the following structure:
-        {{
-            "job_titles": ["word1", "word2"],
-            "required_skills": ["word1", "word2"],
-            "work_arrangements": ["word1", "word2"],
-            "positions": ["word1", "word2"],
-            "exclude_words": ["word1", "word2"]
-        }}
-        """
-        
         try:
-            # Call Claude API with the prompt
-            response = await self.analyze_text(prompt, "Generate job search keywords based on the candidate data")
-            
-            # Extract text content from response
-            content = response.get("content", [{}])[0].get("text", "")
-            if not content:
-                raise ValueError("Empty response from Claude API")
-            
-            # Find JSON in response
-            start = content.find("{")
-            end = content.rfind("}") + 1
-            if start == -1 or end == 0:
-                raise ValueError("Could not find JSON in response")
-            
-            json_str = content[start:end]
+            # Static instructions go to the cached system prompt, candidate data is the only variable part.
+            # The response is streamed and cut off as soon as the keywords object is complete
+            json_str = await self.stream_json_message(
+                system=JOB_QUERY_KEYWORDS_INSTRUCTIONS,
+                text=json.dumps(candidate_data, ensure_ascii=False),
+                model=KEYWORDS_MODEL,
+                max_tokens=KEYWORDS_MAX_TOKENS,
+                temperature=KEYWORDS_TEMPERATURE
+            )
             
             # Parse JSON and validate with Pydantic model
             return JobQueryKeywords.model_validate_json(json_str)
@@ -597,4 +704,9 @@ class ClaudeClient:
             raise HTTPException(
                 status_code=500,
                 detail="Failed to generate job query keywords"
-            ) 
\ No newline at end of file
+            ) 
+
+@lru_cache(maxsize=1)
+def get_claude_client() -> ClaudeClient:
+    """Get shared Claude client instance"""
+    return ClaudeClient()
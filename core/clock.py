@@ -0,0 +1,7 @@
+"""Time helpers"""
+
+from datetime import datetime, timezone
+
+def utc_now() -> datetime:
+    """Get current timezone-aware UTC time"""
+    return datetime.now(timezone.utc)
@@ -1,4 +1,8 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ExecutionTimeout
+from typing import Any, Dict, Optional
+from models.resumes import ResumeProcessingStatus
+import asyncio
 import os
 import logging
 
@@ -9,6 +13,34 @@ logger = logging.getLogger(__name__)
 client = None
 db = None
 
+# Compound index serving per-user list queries filtered by status
+# and sorted by status then creation date
+USER_STATUS_CREATED_INDEX = [("user_id", 1), ("status", 1), ("created_at", -1)]
+
+# Per-user index for fetching documents by owner in _id order
+USER_ID_INDEX = [("user_id", 1), ("_id", -1)]
+
+# Resume list order; _id makes it total for keyset pagination
+RESUME_LIST_INDEX = [("user_id", 1), ("status", 1), ("created_at", -1), ("_id", -1)]
+
+# Resumes whose background processing has not finished, by last update;
+# partial, so it only holds the few rows still processing
+RESUME_PROCESSING_INDEX = [("updated_at", 1)]
+
+# Lookup of a user's stored file by content hash, used to dedupe uploads
+GRIDFS_USER_SHA256_INDEX = [("metadata.user_id", 1), ("metadata.sha256", 1)]
+
+# Resumes referencing a GridFS file; deduped uploads share one file
+RESUME_FILE_INDEX = [("file_id", 1)]
+
+# User lookups by email and by username; together they let $or queries
+# on both fields (login, signup checks) use an index union
+USER_EMAIL_INDEX = [("email", 1)]
+USER_USERNAME_INDEX = [("username", 1)]
+
+# Time limit for list counts; slower counts are reported as unknown
+COUNT_MAX_TIME_MS = 500
+
 def get_db():
     """Get database instance"""
     if db is None:
@@ -28,7 +60,8 @@ async def init_db():
         logger.info(f"Attempting to connect to MongoDB with URL: {mongo_url}")
         
         # Create client and connect to database
-        client = AsyncIOMotorClient(mongo_url)
+        # tz_aware keeps datetimes read back consistent with the aware UTC values we write
+        client = AsyncIOMotorClient(mongo_url, tz_aware=True)
         await client.admin.command('ping')
         logger.info("Successfully pinged MongoDB server")
         
@@ -39,6 +72,49 @@ async def init_db():
         # Check users collection access
         await db.users.find_one()
         logger.info("Successfully accessed users collection")
+
+        await ensure_indexes()
     except Exception as e:
         logger.error(f"Failed to initialize database: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
+
+async def ensure_indexes():
+    """Create indexes used by list queries (documented in README)"""
+    await asyncio.gather(
+        db.users.create_index(USER_EMAIL_INDEX),
+        db.users.create_index(USER_USERNAME_INDEX),
+        db.job_flows.create_index(USER_STATUS_CREATED_INDEX),
+        db.job_queries.create_index(USER_STATUS_CREATED_INDEX),
+        db.job_queries.create_index(USER_ID_INDEX),
+        db.resumes.create_index(USER_ID_INDEX),
+        # Also serves the (user_id, status, created_at) prefix used by counts
+        db.resumes.create_index(RESUME_LIST_INDEX),
+        db.resumes.create_index(RESUME_FILE_INDEX),
+        db.resumes.create_index(
+            RESUME_PROCESSING_INDEX,
+            partialFilterExpression={"processing_status": ResumeProcessingStatus.PROCESSING.value}
+        ),
+        db["fs.files"].create_index(GRIDFS_USER_SHA256_INDEX)
+    )
+    logger.info("Successfully ensured database indexes")
+
+async def count_documents_hinted(collection, query: Dict[str, Any]) -> Optional[int]:
+    """
+    Count documents using the per-user compound index.
+    
+    Args:
+        collection: Motor collection
+        query: Filter with user_id and optional status
+        
+    Returns:
+        Number of documents or None if counting exceeded the time limit
+    """
+    try:
+        return await collection.count_documents(
+            query,
+            hint=USER_STATUS_CREATED_INDEX,
+            maxTimeMS=COUNT_MAX_TIME_MS
+        )
+    except ExecutionTimeout:
+        logger.warning(f"Count on {collection.name} exceeded {COUNT_MAX_TIME_MS}ms")
+        return None
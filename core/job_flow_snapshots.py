@@ -0,0 +1,86 @@
+"""Denormalized resume, cover letter and job query data stored on job flows"""
+
+import logging
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Fields copied from each referenced document into "<name>_snapshot"
+SNAPSHOT_FIELDS = {
+    "resume": ("filename",),
+    "cover_letter": ("name", "content"),
+    "job_query": ("name", "query"),
+}
+
+def snapshot_projection(name: str) -> Dict[str, int]:
+    """Projection for reading the snapshot fields of a referenced document"""
+    return {field: 1 for field in SNAPSHOT_FIELDS[name]}
+
+def build_snapshot(name: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Build snapshot from a referenced document"""
+    return {field: doc.get(field, "") for field in SNAPSHOT_FIELDS[name]}
+
+def empty_snapshot(name: str) -> Dict[str, str]:
+    """Snapshot for a referenced document that no longer exists"""
+    return {field: "" for field in SNAPSHOT_FIELDS[name]}
+
+async def update_job_flow_snapshots(db, name: str, ref_id: str, values: Dict[str, Any]) -> None:
+    """
+    Propagate changes of a referenced document to job flows that use it.
+
+    Args:
+        db: Database instance
+        name: Reference name (resume, cover_letter or job_query)
+        ref_id: Referenced document ID
+        values: Changed snapshot fields
+    """
+    if not values:
+        return
+    await db.job_flows.update_many(
+        {f"{name}_id": ref_id},
+        {"$set": {f"{name}_snapshot.{field}": value for field, value in values.items()}}
+    )
+
+def _lookup_stage(name: str, collection: str) -> Dict[str, Any]:
+    return {"$lookup": {
+        "from": collection,
+        # Malformed reference ids resolve to no document instead of failing the backfill
+        "let": {"ref_id": {"$convert": {"input": f"${name}_id", "to": "objectId", "onError": None, "onNull": None}}},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$_id", "$$ref_id"]}}},
+            {"$project": {"_id": 0, **snapshot_projection(name)}}
+        ],
+        "as": f"{name}_data"
+    }}
+
+def _snapshot_expr(name: str) -> Dict[str, Any]:
+    return {
+        field: {"$ifNull": [{"$arrayElemAt": [f"${name}_data.{field}", 0]}, ""]}
+        for field in SNAPSHOT_FIELDS[name]
+    }
+
+async def backfill_job_flow_snapshots(db) -> None:
+    """Fill snapshots for job flows created before they were stored"""
+    pipeline = [
+        {"$match": {"resume_snapshot": {"$exists": False}}},
+        _lookup_stage("resume", "resumes"),
+        _lookup_stage("cover_letter", "cover_letters"),
+        _lookup_stage("job_query", "job_queries"),
+        {"$project": {
+            "resume_snapshot": _snapshot_expr("resume"),
+            "cover_letter_snapshot": _snapshot_expr("cover_letter"),
+            "job_query_snapshot": _snapshot_expr("job_query")
+        }},
+        {"$merge": {
+            "into": "job_flows",
+            "on": "_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard"
+        }}
+    ]
+    try:
+        await db.job_flows.aggregate(pipeline).to_list(length=None)
+        logger.info("Job flow snapshots are up to date")
+    except Exception as e:
+        # Not fatal: flows without snapshots are listed with empty names
+        logger.warning(f"Failed to backfill job flow snapshots: {str(e)}")
@@ -0,0 +1,29 @@
+"""ASGI middleware"""
+
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+
+class BodySizeLimitMiddleware:
+    """
+    Reject requests whose declared Content-Length exceeds the limit.
+    Runs before FastAPI parses multipart forms, so oversized uploads are
+    refused without being received and spooled to disk.
+    """
+    
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_body_size:
+                        response = ORJSONResponse(
+                            {"detail": f"Request too large. Maximum size: {self.max_body_size/1024/1024:.1f}MB"},
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
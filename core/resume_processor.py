@@ -2,45 +2,101 @@
 
 import os
 import json
+import asyncio
 import logging
 from typing import Dict, Any
-from fastapi import HTTPException
-from .claude_client import ClaudeClient
-from datetime import datetime
+from functools import lru_cache
+from fastapi import HTTPException, status
+from bson import ObjectId
+from models.resumes import ResumeProcessingStatus
+from .claude_client import get_claude_client
+from .clock import utc_now
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-class ResumeProcessor:
+# Uploads still processing after this long were interrupted by a restart
+# or crash, since processing runs in-process and is not persisted
+PROCESSING_TIMEOUT = timedelta(minutes=10)
+
+# Seconds between checks for interrupted processing
+PROCESSING_SWEEP_INTERVAL = 300
+
+@lru_cache(maxsize=1)
+def resume_prompt() -> str:
     """
-    Processes resumes and extracts information using Claude API.
+    Build the resume extraction prompt from the sample JSON structure.
+    Cached so the sample file is read and serialized once per process
+    instead of on the event loop for every upload; loaded at startup.
     """
+    # Read sample JSON structure
+    with open("assets/json/CV_sample.json", "r", encoding='utf-8') as f:
+        sample_json = json.load(f)
     
-    async def process_resume(self, file_content: bytes, file_extension: str) -> Dict[str, Any]:
-        """
-        Process resume and extract information.
+    # Create prompt for Claude
+    return f"""
+        Analyze the provided resume and extract information in JSON format.
+        Use the following structure, but include only fields that have information in the resume:
+        {json.dumps(sample_json, indent=2, ensure_ascii=False)}
         
-        Args:
-            file_content: Resume file content in bytes
-            file_extension: File extension (with dot)
-            
-        Returns:
-            Dictionary with extracted information
+        Instructions:
+        1. Carefully examine the resume text
+        2. Extract only available information, skipping empty fields
+        3. Return the result in JSON format
+        4. Make sure all strings are properly escaped
+        5. Do not add comments or text outside JSON
+        6. Use compact format for arrays if they contain simple values
         """
+
+def ensure_resume_processed(resume: Dict[str, Any]) -> None:
+    """
+    Check that candidate data of a stored resume is available.
+    Resumes stored before background processing have no processing_status
+    and count as processed.
+    
+    Args:
+        resume: Resume document including processing_status
+    """
+    processing_status = resume.get("processing_status", ResumeProcessingStatus.COMPLETED)
+    if processing_status != ResumeProcessingStatus.COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Resume is not processed (processing status: {processing_status})"
+        )
+
+async def fail_stale_processing(db) -> None:
+    """
+    Mark resumes whose background processing was interrupted as failed,
+    so they stop reporting processing forever.
+    Owners' resume list versions are bumped to invalidate list ETags.
+    """
+    stale = {
+        "processing_status": ResumeProcessingStatus.PROCESSING,
+        "updated_at": {"$lt": utc_now() - PROCESSING_TIMEOUT}
+    }
+    user_ids = await db.resumes.distinct("user_id", stale)
+    if not user_ids:
+        return
+    
+    result = await db.resumes.update_many(
+        stale,
+        {"$set": {"processing_status": ResumeProcessingStatus.FAILED, "updated_at": utc_now()}}
+    )
+    await db.users.update_many(
+        {"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}},
+        {"$inc": {"resume_list_version": 1}}
+    )
+    logger.warning("Marked %s resumes with interrupted processing as failed", result.modified_count)
+
+async def sweep_stale_processing(db) -> None:
+    """Run fail_stale_processing periodically for the lifetime of the application"""
+    while True:
         try:
-            # Convert file content to text
-            text_content = file_content.decode('utf-8')
-            
-            # Initialize Claude client
-            claude_client = ClaudeClient()
-            
-            # Extract information using Claude
-            extracted_info = await claude_client.extract_resume_info(text_content)
-            
-            return extracted_info
-            
+            await fail_stale_processing(db)
         except Exception as e:
-            logger.error(f"Error processing resume: {str(e)}")
-            raise
+            # Not fatal: the next sweep retries
+            logger.warning("Failed to sweep interrupted resume processing: %s", e)
+        await asyncio.sleep(PROCESSING_SWEEP_INTERVAL)
 
 async def process_resume(file_content: bytes, file_extension: str) -> Dict[str, Any]:
     """
@@ -54,36 +110,19 @@ async def process_resume(file_content: bytes, file_extension: str) -> Dict[str,
         Dict with extracted resume information
     """
     try:
-        # Read sample JSON structure
-        with open("assets/json/CV_sample.json", "r", encoding='utf-8') as f:
-            sample_json = json.load(f)
-        
-        # Create prompt for Claude
-        prompt = f"""
-        Analyze the provided resume and extract information in JSON format.
-        Use the following structure, but include only fields that have information in the resume:
-        {json.dumps(sample_json, indent=2, ensure_ascii=False)}
-        
-        Instructions:
-        1. Carefully examine the resume text
-        2. Extract only available information, skipping empty fields
-        3. Return the result in JSON format
-        4. Make sure all strings are properly escaped
-        5. Do not add comments or text outside JSON
-        6. Use compact format for arrays if they contain simple values
-        """
+        prompt = resume_prompt()
         
         logger.info("Starting resume processing")
         
-        # Initialize Claude client
-        client = ClaudeClient()
+        # Get shared Claude client
+        client = get_claude_client()
         
         # Analyze resume
         result = await client.analyze_file(file_content, file_extension, prompt)
         
         # Extract JSON from response
         content = result.get("content", [{}])[0].get("text", "")
-        logger.debug(f"Raw response from Claude: {content}")
+        logger.debug("Raw response from Claude: %s", content)
         
         # Find JSON in response, skipping any text before and after
         start = content.find("{")
@@ -93,7 +132,7 @@ async def process_resume(file_content: bytes, file_extension: str) -> Dict[str,
             raise ValueError("Could not find JSON in response")
             
         json_str = content[start:end]
-        logger.debug(f"Extracted JSON: {json_str}")
+        logger.debug("Extracted JSON: %s", json_str)
         
         try:
             result = json.loads(json_str)
@@ -103,8 +142,8 @@ async def process_resume(file_content: bytes, file_extension: str) -> Dict[str,
             try:
                 result = json.loads(json_str)
             except json.JSONDecodeError as e:
-                logger.error(f"Error parsing JSON: {str(e)}")
-                logger.error(f"Problematic JSON: {json_str}")
+                logger.error("Error parsing JSON: %s", e)
+                logger.error("Problematic JSON: %s", json_str)
                 raise ValueError(f"Error parsing JSON: {str(e)}")
         
         # Check result structure
@@ -124,7 +163,7 @@ async def process_resume(file_content: bytes, file_extension: str) -> Dict[str,
         return result
         
     except Exception as e:
-        logger.error(f"Error processing resume: {str(e)}")
+        logger.error("Error processing resume: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process resume: {str(e)}"
@@ -1,159 +1,194 @@
 """File storage module"""
 
-import os
 import uuid
+import asyncio
+import hashlib
 from fastapi import UploadFile, HTTPException
-from typing import Optional, Tuple, List
+from typing import AsyncIterator, Optional, Tuple, List
 import logging
 from motor.motor_asyncio import AsyncIOMotorGridFSBucket
-from core.database import db, get_db
+from core.database import get_db
 from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
 
 logger = logging.getLogger(__name__)
 
 # Configuration
-ALLOWED_EXTENSIONS = {'.pdf', '.doc', '.docx', '.txt', '.rtf'}
+ALLOWED_EXTENSIONS = frozenset({'.pdf', '.doc', '.docx', '.txt', '.rtf'})
+RESUME_EXTENSIONS = frozenset({'.pdf', '.doc', '.docx'})  # Formats the resume parser accepts
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+UPLOAD_CHUNK_SIZE = 255 * 1024  # GridFS default chunk size
+MAX_REQUEST_SIZE = MAX_FILE_SIZE + 64 * 1024  # Largest file plus multipart overhead
+
+# GridFS bucket bound to the current database
+_bucket: Optional[AsyncIOMotorGridFSBucket] = None
+_bucket_db = None
+
+def get_bucket() -> AsyncIOMotorGridFSBucket:
+    """Get GridFS bucket, created once per database instance"""
+    global _bucket, _bucket_db
+    db = get_db()
+    if _bucket is None or _bucket_db is not db:
+        _bucket = AsyncIOMotorGridFSBucket(db)
+        _bucket_db = db
+    return _bucket
 
 def get_file_extension(filename: str) -> str:
-    """Get file extension"""
-    return os.path.splitext(filename)[1].lower()
+    """Get lowercase file extension with the dot, or empty string if none"""
+    _, dot, extension = filename.rpartition('.')
+    return f".{extension.lower()}" if dot else ""
 
 def is_allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
     return get_file_extension(filename) in ALLOWED_EXTENSIONS
 
-async def save_uploaded_file(file: UploadFile) -> Tuple[str, str]:
+async def open_file_stream(file_id: str):
     """
-    Save uploaded file to GridFS
-    Returns tuple (filename, file_id)
+    Open GridFS file for streaming download.
+    The returned stream exposes filename and length without reading the content.
+    
+    Args:
+        file_id: GridFS file ID
+        
+    Returns:
+        GridFS download stream
     """
+    fs = get_bucket()
     try:
-        # Check file extension
-        if not is_allowed_file(file.filename):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-            )
-            
-        # Check file size
-        file_size = 0
-        content = []
-        async for chunk in file.read(1024):
-            content.append(chunk)
-            file_size += len(chunk)
-            if file_size > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB"
-                )
-                
-        file_content = b''.join(content)
-        
-        # Save to GridFS
-        fs = AsyncIOMotorGridFSBucket(db)
-        file_id = await fs.upload_from_stream(
-            file.filename,
-            file_content
-        )
-        
-        return file.filename, str(file_id)
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error saving file: {str(e)}")
+        return await fs.open_download_stream(ObjectId(file_id))
+    except NoFile:
         raise HTTPException(
-            status_code=500,
-            detail="Error saving file"
+            status_code=404,
+            detail="File not found"
         )
 
-async def get_file(file_id: str) -> Tuple[bytes, str]:
+async def iter_file_chunks(grid_out) -> AsyncIterator[bytes]:
     """
-    Get file from GridFS
-    Returns tuple (file_content, filename)
+    Yield file content one GridFS chunk at a time
+    
+    Args:
+        grid_out: GridFS download stream
     """
-    try:
-        # Get file from GridFS
-        fs = AsyncIOMotorGridFSBucket(db)
-        
-        # Check if file exists
-        if not await fs.find_one({"_id": file_id}):
-            raise HTTPException(
-                status_code=404,
-                detail="File not found"
-            )
-            
-        # Read file content
-        grid_out = await fs.open_download_stream(file_id)
-        file_content = await grid_out.read()
-        filename = grid_out.filename
-        
-        return file_content, filename
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error getting file: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Error getting file"
-        )
+    while chunk := await grid_out.readchunk():
+        yield chunk
 
-async def save_file_content(content: bytes, filename: str, user_id: str) -> str:
+async def save_upload(file: UploadFile, user_id: str) -> Tuple[str, bytes]:
     """
-    Save file bytes to GridFS
-    Returns file_id
+    Read uploaded file and store it in GridFS.
+    The content is fully buffered in memory: it is hashed for deduplication
+    before anything is written, and returned for resume processing.
+    Extension and declared size are checked before reading, and the
+    size limit is enforced again while reading in case it was not known.
+    If the user already stored the same file, its GridFS ID is reused
+    and nothing is written.
+    
+    Args:
+        file: Uploaded file
+        user_id: Owner user ID
+        
+    Returns:
+        Tuple (file_id, file_content)
     """
-    if not is_allowed_file(filename):
+    if not is_allowed_file(file.filename):
         raise HTTPException(
             status_code=400,
             detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
-    # Check file size
-    if len(content) > MAX_FILE_SIZE:
+    # Size of the spooled upload is known up front; reject before
+    # reading any content
+    if file.size is not None and file.size > MAX_FILE_SIZE:
         raise HTTPException(
-            status_code=400,
+            status_code=413,
             detail=f"File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB"
         )
 
+    file_size = 0
+    chunks = []
+    sha256 = hashlib.sha256()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        file_size += len(chunk)
+        if file_size > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB"
+            )
+        sha256.update(chunk)
+        chunks.append(chunk)
+    content = b''.join(chunks)
+    digest = sha256.hexdigest()
+
     try:
-        # Get GridFS bucket
-        db = get_db()
-        fs = AsyncIOMotorGridFSBucket(db)
-        
-        # Upload file to GridFS
-        file_id = await fs.upload_from_stream(
-            filename,
+        # Deduplicate per user only, so uploads never reveal other users' files.
+        # Taking the reference in the same operation keeps a concurrent
+        # release from deleting the file; released files have no references
+        # left and are never reused.
+        existing = await get_db()["fs.files"].find_one_and_update(
+            {"metadata.user_id": user_id, "metadata.sha256": digest, "metadata.ref_count": {"$gt": 0}},
+            {"$inc": {"metadata.ref_count": 1}},
+            projection={"_id": 1}
+        )
+        if existing is not None:
+            logger.info("Reusing stored file %s for duplicate upload", existing['_id'])
+            return str(existing["_id"]), content
+
+        file_id = await get_bucket().upload_from_stream(
+            file.filename,
             content,
             metadata={
                 "user_id": user_id,
-                "content_type": f"application/{get_file_extension(filename)[1:]}",
-                "original_filename": filename
+                "content_type": f"application/{get_file_extension(file.filename)[1:]}",
+                "original_filename": file.filename,
+                "sha256": digest,
+                "ref_count": 1
             }
         )
-        
-        return str(file_id)
+        return str(file_id), content
         
     except Exception as e:
-        logger.error(f"Error saving file: {str(e)}")
+        logger.error("Error saving file: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Error saving file"
         )
 
+async def release_file(file_id: str) -> Optional[int]:
+    """
+    Drop one reference to a stored file.
+    
+    Args:
+        file_id: GridFS file ID
+        
+    Returns:
+        Number of references left, or None for files stored without
+        reference counting (those are never deduplicated onto)
+    """
+    stored = await get_db()["fs.files"].find_one_and_update(
+        {"_id": ObjectId(file_id), "metadata.ref_count": {"$exists": True}},
+        {"$inc": {"metadata.ref_count": -1}},
+        projection={"metadata.ref_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return stored["metadata"]["ref_count"] if stored else None
+
 async def delete_file(file_id: str) -> None:
     """
-    Delete file from GridFS
+    Delete file from GridFS.
+    The file document and its chunks are removed concurrently instead of
+    one after the other as GridFSBucket.delete does; chunks are matched by
+    the files_id index GridFS creates on first upload.
     
     Args:
         file_id: GridFS file ID
     """
+    db = get_db()
+    file_id = ObjectId(file_id)
     try:
-        db = get_db()
-        fs = AsyncIOMotorGridFSBucket(db)
-        await fs.delete(file_id)
+        await asyncio.gather(
+            db["fs.files"].delete_one({"_id": file_id}),
+            db["fs.chunks"].delete_many({"files_id": file_id})
+        )
     except Exception as e:
-        logger.error(f"Error deleting file from GridFS: {str(e)}")
-        raise 
\ No newline at end of file
+        logger.error("Error deleting file from GridFS: %s", e)
+        raise
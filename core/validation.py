@@ -0,0 +1,43 @@
+"""Request validation helpers"""
+
+import re
+from typing import Callable
+from bson import ObjectId
+from fastapi import HTTPException, Path, status
+
+# Hex form of an ObjectId; checked up front because ObjectId.is_valid
+# itself constructs an ObjectId and catches the exception
+_OBJECT_ID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+def parse_object_id(value: str, detail: str = "Invalid ID format") -> ObjectId:
+    """
+    Convert string to ObjectId without relying on exception handling.
+
+    Args:
+        value: String representation of the ID
+        detail: Error message for malformed IDs
+
+    Returns:
+        Parsed ObjectId
+    """
+    if not _OBJECT_ID_RE.fullmatch(value):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
+    return ObjectId(value)
+
+def valid_object_id(param: str, detail: str = "Invalid ID format") -> Callable[[str], ObjectId]:
+    """
+    Build a dependency that parses the given path parameter into an ObjectId.
+
+    Args:
+        param: Name of the path parameter
+        detail: Error message for malformed IDs
+
+    Returns:
+        FastAPI dependency returning ObjectId
+    """
+    def dependency(value: str = Path(..., alias=param)) -> ObjectId:
+        return parse_object_id(value, detail)
+    return dependency
@@ -1,11 +1,18 @@
 """Main application module"""
 
+import asyncio
 import logging
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
-from core.database import init_db
+from core.database import init_db, get_db
+from core.job_flow_snapshots import backfill_job_flow_snapshots
+from core.claude_client import get_claude_client
+from core.resume_processor import resume_prompt, sweep_stale_processing
+from core.middleware import BodySizeLimitMiddleware
+from core.storage import MAX_REQUEST_SIZE
 from routers import auth, resumes, cover_letters, default, job_queries, job_flow
 
 # Configure logging
@@ -27,9 +34,14 @@ app = FastAPI(
     description="API for job application management",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
+# Refuse oversized request bodies before they are read
+# (added first so CORS headers still wrap the 413 response)
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=MAX_REQUEST_SIZE)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -39,21 +51,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    # Log details server-side only; clients get a generic message
+    logger.exception(f"Unhandled error on {request.method} {request.url.path}: {str(exc)}")
+    return ORJSONResponse(
+        status_code=500,
+        content={"detail": "Internal server error"}
+    )
+
 # Initialize database
 @app.on_event("startup")
 async def startup_event():
     try:
         await init_db()
         logger.info("Successfully connected to MongoDB")
+        await backfill_job_flow_snapshots(get_db())
+        # Read the resume prompt sample once here rather than with
+        # blocking file I/O inside the first upload request
+        await asyncio.to_thread(resume_prompt)
+        # Uploads are processed in-process; fail the ones a restart interrupted
+        app.state.processing_sweep = asyncio.create_task(sweep_stale_processing(get_db()))
         logger.info(f"Application will run on port: {PORT}")
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    processing_sweep = getattr(app.state, "processing_sweep", None)
+    if processing_sweep is not None:
+        processing_sweep.cancel()
+    # Close the shared Claude HTTP client only if it was ever created
+    if get_claude_client.cache_info().currsize:
+        await get_claude_client().aclose()
+
 # Include routers
 app.include_router(default.router, tags=["default"])
-app.include_router(auth.router, prefix="/auth", tags=["authentication"])
-app.include_router(resumes.router, prefix="/resumes", tags=["resumes"])
-app.include_router(cover_letters.router, prefix="/cover-letters", tags=["cover-letters"])
-app.include_router(job_queries.router, prefix="/job-queries", tags=["job-queries"])
-app.include_router(job_flow.router, prefix="/job-flow", tags=["job-flow"]) 
\ No newline at end of file
+app.include_router(auth.router, prefix="/auth")
+app.include_router(resumes.router, prefix="/resumes")
+app.include_router(cover_letters.router, prefix="/cover-letters")
+app.include_router(job_queries.router, prefix="/job-queries")
+app.include_router(job_flow.router, prefix="/job-flow") 
\ No newline at end of file
@@ -1,3 +1,4 @@
+from models.common import Pagination
 from models.users import UserBase, UserCreate, User, UserInDB
 from models.auth import (
     SignInRequest, AccessToken, TokenData,
@@ -7,13 +8,20 @@ from models.cover_letters import (
     CoverLetter, CoverLetterContent, CoverLetterCreate,
     CoverLetterStatus, CoverLetterStatusUpdate, CoverLetterUpdate
 )
-from models.resumes import Resume, ResumeCreate, ResumeStatus, ResumeStatusUpdate, ResumeScoringRequest
+from models.resumes import (
+    Resume, ResumeCreate, ResumeStatus, ResumeStatusUpdate, ResumeScoringRequest,
+    ResumeProcessingStatus, ResumeProcessingInfo, ResumeListItem, ResumeListResponse
+)
 from models.job_flow import (
     JobFlow, JobFlowCreate, JobFlowUpdate, 
-    JobFlowStatus, JobFlowStatusUpdate, JobFlowSource
+    JobFlowStatus, JobFlowStatusUpdate, JobFlowSource,
+    JobFlowListItem, JobFlowListResponse
 )
 
 __all__ = [
+    # Shared models
+    "Pagination",
+    
     # User models
     "UserBase",
     "UserCreate",
@@ -41,6 +49,10 @@ __all__ = [
     "ResumeStatus",
     "ResumeStatusUpdate",
     "ResumeScoringRequest",
+    "ResumeProcessingStatus",
+    "ResumeProcessingInfo",
+    "ResumeListItem",
+    "ResumeListResponse",
     
     # Job Flow models
     "JobFlow",
@@ -48,5 +60,7 @@ __all__ = [
     "JobFlowUpdate",
     "JobFlowStatus",
     "JobFlowStatusUpdate",
-    "JobFlowSource"
+    "JobFlowSource",
+    "JobFlowListItem",
+    "JobFlowListResponse"
 ] 
\ No newline at end of file
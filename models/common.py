@@ -0,0 +1,11 @@
+"""Shared models"""
+
+from typing import Optional
+from pydantic import BaseModel
+
+class Pagination(BaseModel):
+    """Pagination info for list responses"""
+    total: Optional[int]  # None when counting timed out
+    currentPage: int
+    totalPages: Optional[int]
+    perPage: int
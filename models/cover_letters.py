@@ -5,6 +5,7 @@ from typing import Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 from bson import ObjectId
+from core.clock import utc_now
 
 class CoverLetterStatus(str, Enum):
     ACTIVE = "active"
@@ -50,8 +51,8 @@ class CoverLetter(BaseModel):
     name: str
     content: CoverLetterContent
     status: CoverLetterStatus = CoverLetterStatus.ARCHIVED
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now)
+    updated_at: datetime = Field(default_factory=utc_now)
 
     class Config:
         from_attributes = True
@@ -1,8 +1,10 @@
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Union, Dict, Any
 from pydantic import BaseModel, Field
 from datetime import datetime
 from bson import ObjectId
+from core.clock import utc_now
+from models.common import Pagination
 
 class JobFlowSource(str, Enum):
     INTERNAL = "internal"
@@ -37,8 +39,8 @@ class JobFlow(BaseModel):
     job_query_id: str
     source: JobFlowSource
     status: JobFlowStatus
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now)
+    updated_at: datetime = Field(default_factory=utc_now)
 
     class Config:
         from_attributes = True
@@ -46,4 +48,34 @@ class JobFlow(BaseModel):
             ObjectId: str,
             datetime: lambda dt: dt.isoformat()
         }
-        populate_by_name = True 
\ No newline at end of file
+        populate_by_name = True
+
+class JobFlowResumeRef(BaseModel):
+    id: str
+    filename: str = ""
+
+class JobFlowCoverLetterRef(BaseModel):
+    id: str
+    name: str = ""
+    content: Union[Dict[str, Any], str] = ""
+
+class JobFlowJobQueryRef(BaseModel):
+    id: str
+    name: str = ""
+    query: str = ""
+
+class JobFlowListItem(BaseModel):
+    """Job flow with joined resume, cover letter and job query data"""
+    id: str
+    user_id: str
+    source: JobFlowSource
+    status: JobFlowStatus
+    created_at: datetime
+    updated_at: datetime
+    resume: JobFlowResumeRef
+    cover_letter: JobFlowCoverLetterRef
+    job_query: JobFlowJobQueryRef
+
+class JobFlowListResponse(BaseModel):
+    list: List[JobFlowListItem]
+    pagination: Pagination
@@ -3,6 +3,8 @@ from typing import List, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 from bson import ObjectId
+from core.clock import utc_now
+from models.common import Pagination
 
 class JobQueryStatus(str, Enum):
     ACTIVE = "active"
@@ -36,8 +38,8 @@ class JobQuery(BaseModel):
     keywords: JobQueryKeywords
     query: str
     status: JobQueryStatus
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now)
+    updated_at: datetime = Field(default_factory=utc_now)
 
     class Config:
         from_attributes = True
@@ -47,9 +49,21 @@ class JobQuery(BaseModel):
         }
         populate_by_name = True
 
+class JobQueryListResponse(BaseModel):
+    list: List[JobQuery]
+    pagination: Pagination
+
 # Существующие модели
 class JobQueryGenerateRequest(BaseModel):
     resume_id: str
 
 class JobQueryResponse(BaseModel):
-    keywords: JobQueryKeywords 
\ No newline at end of file
+    keywords: JobQueryKeywords
+
+class JobQueryBatchGenerateRequest(BaseModel):
+    # Each resume costs a Claude call, so batches are capped
+    resume_ids: List[str] = Field(..., max_length=20)
+
+class JobQueryBatchItem(BaseModel):
+    resume_id: str
+    keywords: JobQueryKeywords
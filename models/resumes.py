@@ -1,15 +1,29 @@
 """Models for resumes"""
 
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field
 from datetime import datetime
+from core.clock import utc_now
+from models.common import Pagination
 
 class ResumeStatus(str, Enum):
     """Resume status options"""
     ACTIVE = "active"
     ARCHIVED = "archived"
 
+class ResumeProcessingStatus(str, Enum):
+    """State of background processing of an uploaded resume"""
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+# Fields added to parsed resume data when it is stored; everything else is candidate data
+RESUME_SERVICE_FIELDS = frozenset({
+    "_id", "user_id", "filename", "file_id", "status", "created_at", "updated_at",
+    "processing_status"
+})
+
 class ResumeStatusUpdate(BaseModel):
     """Model for updating resume status"""
     status: ResumeStatus
@@ -18,8 +32,8 @@ class ResumeBase(BaseModel):
     """Base resume model"""
     file_id: str  # File ID in GridFS
     status: ResumeStatus = ResumeStatus.ARCHIVED
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utc_now)
+    updated_at: datetime = Field(default_factory=utc_now)
 
 class ResumeCreate(ResumeBase):
     """Model for creating a new resume"""
@@ -29,6 +43,11 @@ class ResumeScoringRequest(BaseModel):
     """Request model for resume scoring"""
     resume_id: str = Field(..., description="ID of the resume to score")
 
+class ResumeProcessingInfo(BaseModel):
+    """Processing state of an uploaded resume"""
+    id: str
+    processing_status: ResumeProcessingStatus
+
 class Resume(BaseModel):
     """Resume model with scoring fields"""
     id: str = Field(..., alias="_id")
@@ -38,7 +57,7 @@ class Resume(BaseModel):
     status: ResumeStatus = ResumeStatus.ARCHIVED
     created_at: datetime
     updated_at: datetime
-    candidate: Dict[str, Any]
+    candidate: Dict[str, Any] = Field(default_factory=dict)  # Empty until processing completes
     
     # Scoring fields
     scoring: Optional[Dict[str, float]] = Field(None, description="Resume scoring results")
@@ -48,4 +67,24 @@ class Resume(BaseModel):
         allow_population_by_field_name = True
         json_encoders = {
             datetime: lambda v: v.isoformat()
-        } 
\ No newline at end of file
+        } 
+
+class ResumeListItem(BaseModel):
+    """Resume as returned by the list endpoint, without parsed content"""
+    id: str
+    user_id: str
+    filename: str
+    file_id: str = ""
+    status: ResumeStatus
+    created_at: datetime
+    scoring: Dict[str, float]
+    processing_status: ResumeProcessingStatus
+
+class ResumeListPagination(Pagination):
+    """Pagination info of the resume list; cursor pages have no page number or total"""
+    currentPage: Optional[int]
+    nextCursor: Optional[str] = None
+
+class ResumeListResponse(BaseModel):
+    list: List[ResumeListItem]
+    pagination: ResumeListPagination
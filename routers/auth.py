@@ -126,13 +126,13 @@ class OnboardingUpdate(BaseModel):
 @router.patch("/onboarding", response_model=User)
 async def update_onboarding(
     update_data: OnboardingUpdate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Update user's onboarding status
     """
     try:
-        db = get_db()
         await db.users.update_one(
             {"_id": ObjectId(current_user.id)},
             {"$set": {"onboarding": update_data.onboarding}}
@@ -1,23 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, BackgroundTasks
 from typing import List, Optional
 from models.cover_letters import (
     CoverLetter, CoverLetterCreate, CoverLetterStatus,
     CoverLetterStatusUpdate, CoverLetterGenerateRequest,
     CoverLetterRenderRequest, CoverLetterContent, CoverLetterUpdate
 )
-from models.resumes import Resume
+from models.resumes import Resume, RESUME_SERVICE_FIELDS
 from core.auth import get_current_user
 from models.users import User
-from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from pymongo import ReturnDocument
 import os
+import asyncio
 from typing import Dict, Any
 from core.database import get_db
-from datetime import datetime
-from core.claude_client import ClaudeClient
+from core.validation import valid_object_id, parse_object_id
+from core.clock import utc_now
+from core.claude_client import ClaudeClient, get_claude_client
+from core.resume_processor import ensure_resume_processed
+from core.job_flow_snapshots import update_job_flow_snapshots, empty_snapshot
 
 router = APIRouter(tags=["cover-letters"])
 
+# Resume fields passed to Claude as candidate data, plus processing_status
+# which is checked and removed before the call
+_CANDIDATE_PROJECTION = dict.fromkeys(RESUME_SERVICE_FIELDS - {"processing_status"}, 0)
+
+_cover_letter_id = valid_object_id("cover_letter_id", "Invalid cover letter ID format")
+
+def _cover_letter_from_doc(doc: Dict[str, Any]) -> CoverLetter:
+    """Build CoverLetter from a stored document, skipping Pydantic validation"""
+    return CoverLetter.model_construct(
+        id=str(doc["_id"]),
+        user_id=doc["user_id"],
+        name=doc["name"],
+        content=CoverLetterContent.model_construct(**doc["content"]),
+        status=CoverLetterStatus(doc.get("status", CoverLetterStatus.ARCHIVED)),
+        created_at=doc.get("created_at") or utc_now(),
+        updated_at=doc.get("updated_at") or utc_now()
+    )
+
 async def get_cover_letters_by_user(
     user_id: str,
     page: int = 1,
@@ -41,17 +63,21 @@ async def get_cover_letters_by_user(
     if status is not None:
         query["status"] = status
     
-    # Get total number of documents
-    total = await db.cover_letters.count_documents(query)
-    
     # Get documents with pagination
     cursor = db.cover_letters.find(query).sort([
         ("status", 1),  # 1 for ascending, to have "active" first (since active < archived alphabetically)
         ("created_at", -1)  # -1 for descending, to have newest first
     ]).skip(skip).limit(per_page)
-    cover_letters = await cursor.to_list(length=per_page)
+    
+    # Count and fetch the page concurrently; $facet would save a round-trip,
+    # but its sub-pipelines cannot use indexes
+    total, cover_letters = await asyncio.gather(
+        db.cover_letters.count_documents(query),
+        cursor.to_list(length=per_page)
+    )
     
     # Convert ObjectId to strings
+    now = utc_now()
     processed_letters = []
     for letter in cover_letters:
         letter_dict = {
@@ -60,8 +86,8 @@ async def get_cover_letters_by_user(
             "name": letter["name"],
             "content": letter["content"],
             "status": letter.get("status", CoverLetterStatus.ARCHIVED),
-            "created_at": letter.get("created_at", datetime.utcnow()),
-            "updated_at": letter.get("updated_at", datetime.utcnow())
+            "created_at": letter.get("created_at", now),
+            "updated_at": letter.get("updated_at", now)
         }
         processed_letters.append(letter_dict)
     
@@ -79,7 +105,7 @@ async def get_cover_letters_by_user(
 async def list_cover_letters(
     page: int = 1,
     per_page: int = 10,
-    status: Optional[CoverLetterStatus] = None,
+    status_filter: Optional[CoverLetterStatus] = Query(None, alias="status"),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -87,10 +113,10 @@ async def list_cover_letters(
     """
     try:
         return await get_cover_letters_by_user(
-            user_id=str(current_user.id),
+            user_id=current_user.id,
             page=page,
             per_page=per_page,
-            status=status
+            status=status_filter
         )
     except Exception as e:
         raise HTTPException(
@@ -101,30 +127,27 @@ async def list_cover_letters(
 @router.post("", response_model=CoverLetter)
 async def create_cover_letter(
     cover_letter: CoverLetterCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Create a new cover letter
     """
     try:
-        db = get_db()
-        
         # Add system fields
+        now = utc_now()
         cover_letter_dict = cover_letter.model_dump()
         cover_letter_dict.update({
-            "user_id": str(current_user.id),
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "user_id": current_user.id,
+            "created_at": now,
+            "updated_at": now
         })
         
-        # Save to database
-        result = await db.cover_letters.insert_one(cover_letter_dict)
-        
-        # Get created document
-        created_letter = await db.cover_letters.find_one({"_id": result.inserted_id})
-        created_letter["id"] = str(created_letter.pop("_id"))
+        # Save to database; the response is built from the written data,
+        # which insert_one completes with the new _id
+        await db.cover_letters.insert_one(cover_letter_dict)
         
-        return CoverLetter(**created_letter)
+        return _cover_letter_from_doc(cover_letter_dict)
         
     except Exception as e:
         raise HTTPException(
@@ -135,28 +158,19 @@ async def create_cover_letter(
 @router.get("/{cover_letter_id}", response_model=CoverLetter)
 async def get_cover_letter(
     cover_letter_id: str,
-    current_user: User = Depends(get_current_user)
+    object_id: ObjectId = Depends(_cover_letter_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Get cover letter by ID.
     Checks that the document belongs to the current user.
     """
     try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(cover_letter_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid cover letter ID format"
-            )
-        
         # Find document and check user ownership
         cover_letter = await db.cover_letters.find_one({
             "_id": object_id,
-            "user_id": str(current_user.id)
+            "user_id": current_user.id
         })
         
         if not cover_letter:
@@ -165,10 +179,7 @@ async def get_cover_letter(
                 detail="Cover letter not found or access denied"
             )
         
-        # Convert ObjectId to string
-        cover_letter["id"] = str(cover_letter.pop("_id"))
-        
-        return CoverLetter(**cover_letter)
+        return _cover_letter_from_doc(cover_letter)
     except HTTPException:
         raise
     except Exception as e:
@@ -181,57 +192,36 @@ async def get_cover_letter(
 async def update_cover_letter_status(
     cover_letter_id: str,
     status_update: CoverLetterStatusUpdate,
-    current_user: User = Depends(get_current_user)
+    object_id: ObjectId = Depends(_cover_letter_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Update cover letter status
     """
     try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(cover_letter_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid cover letter ID format"
-            )
-        
-        # Check document existence and access rights
-        cover_letter = await db.cover_letters.find_one({
-            "_id": object_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if not cover_letter:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cover letter not found or access denied"
-            )
-        
-        # Update status
-        result = await db.cover_letters.update_one(
-            {"_id": object_id},
+        # Update status if document exists and belongs to current user
+        updated_letter = await db.cover_letters.find_one_and_update(
+            {
+                "_id": object_id,
+                "user_id": current_user.id
+            },
             {
                 "$set": {
                     "status": status_update.status,
-                    "updated_at": datetime.utcnow()
+                    "updated_at": utc_now()
                 }
-            }
+            },
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 0:
+        if updated_letter is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cover letter not updated"
+                detail="Cover letter not found or access denied"
             )
         
-        # Get updated document
-        updated_letter = await db.cover_letters.find_one({"_id": object_id})
-        updated_letter["id"] = str(updated_letter.pop("_id"))
-        
-        return CoverLetter(**updated_letter)
+        return _cover_letter_from_doc(updated_letter)
         
     except HTTPException:
         raise
@@ -244,43 +234,31 @@ async def update_cover_letter_status(
 @router.delete("/{cover_letter_id}", status_code=status.HTTP_200_OK)
 async def delete_cover_letter(
     cover_letter_id: str,
-    current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    object_id: ObjectId = Depends(_cover_letter_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Delete cover letter
     """
     try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(cover_letter_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid cover letter ID format"
-            )
-        
-        # Check document existence and access rights
-        cover_letter = await db.cover_letters.find_one({
+        # Delete document if it exists and belongs to current user
+        result = await db.cover_letters.delete_one({
             "_id": object_id,
-            "user_id": str(current_user.id)
+            "user_id": current_user.id
         })
         
-        if not cover_letter:
+        if result.deleted_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Cover letter not found or access denied"
             )
         
-        # Delete document
-        result = await db.cover_letters.delete_one({"_id": object_id})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cover letter not deleted"
-            )
+        # Job flows that use this cover letter are updated after the response
+        background_tasks.add_task(
+            update_job_flow_snapshots, db, "cover_letter", str(object_id), empty_snapshot("cover_letter")
+        )
         
         return {"message": "Cover letter successfully deleted", "id": cover_letter_id}
         
@@ -295,7 +273,9 @@ async def delete_cover_letter(
 @router.post("/generate")
 async def generate_cover_letter_content(
     request: CoverLetterGenerateRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db),
+    claude_client: ClaudeClient = Depends(get_claude_client)
 ):
     """
     Generate cover letter text based on resume data
@@ -303,34 +283,29 @@ async def generate_cover_letter_content(
     Args:
         request: Text generation request
         current_user: Current user
+        db: Database connection
+        claude_client: Shared Claude client
         
     Returns:
         Generated text
     """
     try:
-        db = get_db()
-        claude_client = ClaudeClient()
-        
-        # Check ObjectId validity
-        try:
-            resume_id = ObjectId(request.resume_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid resume ID format"
-            )
+        resume_id = parse_object_id(request.resume_id, "Invalid resume ID format")
         
-        # Get resume and check access rights
-        resume = await db.resumes.find_one({
+        # Get candidate data from resume and check access rights;
+        # service fields are left out by the projection
+        candidate_data = await db.resumes.find_one({
             "_id": resume_id,
-            "user_id": str(current_user.id)
-        })
+            "user_id": current_user.id
+        }, _CANDIDATE_PROJECTION)
         
-        if not resume:
+        if candidate_data is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Resume not found or access denied"
             )
+        ensure_resume_processed(candidate_data)
+        candidate_data.pop("processing_status", None)
         
         # Check if content_type is valid
         if request.content_type not in ["introduction", "body_part_1", "body_part_2", "conclusion"]:
@@ -339,12 +314,6 @@ async def generate_cover_letter_content(
                 detail="Invalid content type"
             )
         
-        # Extract candidate data from resume, excluding service fields
-        candidate_data = {
-            k: v for k, v in resume.items() 
-            if k not in ["_id", "user_id", "filename", "file_id", "status", "created_at", "updated_at"]
-        }
-        
         # Generate text using Claude
         generated_text = await claude_client.generate_cover_letter_content(
             candidate_data=candidate_data,
@@ -365,7 +334,8 @@ async def generate_cover_letter_content(
 @router.post("/render")
 async def render_cover_letter(
     request: CoverLetterRenderRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    claude_client: ClaudeClient = Depends(get_claude_client)
 ):
     """
     Render cover letter by filling placeholders based on job description
@@ -373,13 +343,12 @@ async def render_cover_letter(
     Args:
         request: Render request with job description and content
         current_user: Current user
+        claude_client: Shared Claude client
         
     Returns:
         Rendered text with filled placeholders
     """
     try:
-        claude_client = ClaudeClient()
-        
         # Convert content to dict for processing
         content_dict = request.content.model_dump()
         
@@ -403,58 +372,45 @@ async def render_cover_letter(
 async def update_cover_letter(
     cover_letter_id: str,
     update_data: CoverLetterUpdate,
-    current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    object_id: ObjectId = Depends(_cover_letter_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Update cover letter content and name
     """
     try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(cover_letter_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid cover letter ID format"
-            )
-        
-        # Check document existence and access rights
-        cover_letter = await db.cover_letters.find_one({
-            "_id": object_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if not cover_letter:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cover letter not found or access denied"
-            )
-        
-        # Update document
-        result = await db.cover_letters.update_one(
-            {"_id": object_id},
+        # Update document if it exists and belongs to current user
+        content = update_data.content.model_dump()
+        updated_letter = await db.cover_letters.find_one_and_update(
+            {
+                "_id": object_id,
+                "user_id": current_user.id
+            },
             {
                 "$set": {
-                    "content": update_data.content.model_dump(),
+                    "content": content,
                     "name": update_data.name,
-                    "updated_at": datetime.utcnow()
+                    "updated_at": utc_now()
                 }
-            }
+            },
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 0:
+        if updated_letter is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cover letter not updated"
+                detail="Cover letter not found or access denied"
             )
         
-        # Get updated document
-        updated_letter = await db.cover_letters.find_one({"_id": object_id})
-        updated_letter["id"] = str(updated_letter.pop("_id"))
+        # Keep job flows that use this cover letter in sync after the response
+        background_tasks.add_task(update_job_flow_snapshots, db, "cover_letter", str(object_id), {
+            "name": update_data.name,
+            "content": content
+        })
         
-        return CoverLetter(**updated_letter)
+        return _cover_letter_from_doc(updated_letter)
         
     except HTTPException:
         raise
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, HTTPException, status
-from motor.motor_asyncio import AsyncIOMotorClient
+from core.database import get_db
+import asyncio
 import logging
-import os
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Upper bound for the ping so liveness probes never hang on a stuck server
+HEALTH_PING_TIMEOUT = 2.0
+
 @router.get("/")
 async def root():
     return {"message": "Welcome to Joba API"}
@@ -13,39 +16,29 @@ async def root():
 @router.get("/health")
 async def health_check():
     try:
-        # Get database URL
-        mongodb_url = os.getenv("MONGO_URL")
-        if not mongodb_url:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="MongoDB URL not configured"
-            )
-        
-        # Create temporary connection for testing
-        client = AsyncIOMotorClient(
-            mongodb_url,
-            serverSelectionTimeoutMS=5000,
-            connectTimeoutMS=5000
-        )
-        
+        # Reuse the shared client pool; the cold connection path
+        # is already verified once in init_db() at startup
+        db = get_db()
+
         # Check connection with ping
-        await client.admin.command('ping')
-        
-        # Check database and collection access
-        test_db = client.joba
-        await test_db.users.find_one()
-        
+        await asyncio.wait_for(db.command('ping'), timeout=HEALTH_PING_TIMEOUT)
+
         return {
             "status": "healthy",
             "database": {
                 "connected": True,
-                "ping": "success",
-                "users_collection": "accessible"
+                "ping": "success"
             }
         }
+    except asyncio.TimeoutError:
+        logger.error("Health check failed: database ping timed out after %ss", HEALTH_PING_TIMEOUT)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database ping timed out"
+        )
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
+        logger.error("Health check failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=str(e)
-        ) 
\ No newline at end of file
+        )
@@ -1,20 +1,77 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse
 from models.job_flow import (
     JobFlowCreate,
     JobFlowUpdate,
     JobFlowStatusUpdate,
     JobFlow,
-    JobFlowStatus
+    JobFlowStatus,
+    JobFlowSource,
+    JobFlowListResponse
 )
 from models.users import User
 from core.auth import get_current_user
+from core.validation import valid_object_id, parse_object_id
+from core.job_flow_snapshots import snapshot_projection, build_snapshot
 from bson import ObjectId
-from core.database import get_db
+from core.database import get_db, count_documents_hinted
 from typing import Dict, Any, Optional, List
-from datetime import datetime
+from core.clock import utc_now
+import asyncio
 
 router = APIRouter(tags=["job-flow"])
 
+_job_flow_id = valid_object_id("job_flow_id", "Invalid job flow ID format")
+
+# Largest batch accepted by POST /batch; bounds the $in lookups and insert_many
+MAX_JOB_FLOW_BATCH = 50
+
+# Sort by status (active first) then by date (newest first)
+_JOB_FLOW_SORT = {"status": 1, "created_at": -1}
+
+# Request-independent part of the list pipeline, built once at import time.
+# Joined data is read from snapshots stored on the job flow, so no $lookup is needed.
+_JOB_FLOW_PIPELINE_TAIL = [
+    {"$project": {
+        "_id": 0,
+        "id": {"$toString": "$_id"},
+        "user_id": 1,
+        "source": 1,
+        "status": 1,
+        "created_at": 1,
+        "updated_at": 1,
+        "resume": {
+            "id": "$resume_id",
+            "filename": {"$ifNull": ["$resume_snapshot.filename", ""]}
+        },
+        "cover_letter": {
+            "id": "$cover_letter_id",
+            "name": {"$ifNull": ["$cover_letter_snapshot.name", ""]},
+            "content": {"$ifNull": ["$cover_letter_snapshot.content", ""]}
+        },
+        "job_query": {
+            "id": "$job_query_id",
+            "name": {"$ifNull": ["$job_query_snapshot.name", ""]},
+            "query": {"$ifNull": ["$job_query_snapshot.query", ""]}
+        }
+    }}
+]
+
+def _job_flow_from_doc(doc: Dict[str, Any]) -> JobFlow:
+    """Build JobFlow from a trusted database document without re-validation"""
+    now = utc_now()
+    return JobFlow.model_construct(
+        id=str(doc["_id"]),
+        user_id=doc["user_id"],
+        resume_id=doc["resume_id"],
+        cover_letter_id=doc["cover_letter_id"],
+        job_query_id=doc["job_query_id"],
+        source=JobFlowSource(doc["source"]),
+        status=JobFlowStatus(doc["status"]),
+        created_at=doc.get("created_at", now),
+        updated_at=doc.get("updated_at", now)
+    )
+
 async def get_job_flows_by_user(
     user_id: str,
     page: int = 1,
@@ -41,137 +98,43 @@ async def get_job_flows_by_user(
     if status is not None:
         match_stage["status"] = status
     
-    # Get total number of documents
-    total = await db.job_flows.count_documents(match_stage)
-    
     # Create aggregation pipeline
     pipeline = [
         # Match the job flows for this user
         {"$match": match_stage},
         # Sort by status (active first) then by date (newest first)
-        {"$sort": {"status": 1, "created_at": -1}},
+        {"$sort": _JOB_FLOW_SORT},
         # Apply pagination
         {"$skip": skip},
         {"$limit": per_page},
-        # Lookup resume data
-        {"$lookup": {
-            "from": "resumes",
-            "let": {"resume_id": {"$toObjectId": "$resume_id"}},
-            "pipeline": [
-                {"$match": {"$expr": {"$eq": ["$_id", "$$resume_id"]}}},
-                {"$project": {"_id": 1, "filename": 1}}
-            ],
-            "as": "resume_data"
-        }},
-        # Lookup cover letter data
-        {"$lookup": {
-            "from": "cover_letters",
-            "let": {"cover_letter_id": {"$toObjectId": "$cover_letter_id"}},
-            "pipeline": [
-                {"$match": {"$expr": {"$eq": ["$_id", "$$cover_letter_id"]}}},
-                {"$project": {"_id": 1, "name": 1, "content": 1}}
-            ],
-            "as": "cover_letter_data"
-        }},
-        # Lookup job query data
-        {"$lookup": {
-            "from": "job_queries",
-            "let": {"job_query_id": {"$toObjectId": "$job_query_id"}},
-            "pipeline": [
-                {"$match": {"$expr": {"$eq": ["$_id", "$$job_query_id"]}}},
-                {"$project": {"_id": 1, "name": 1, "query": 1}}
-            ],
-            "as": "job_query_data"
-        }},
-        # Structure the output
-        {"$project": {
-            "_id": 1,
-            "user_id": 1,
-            "source": 1,
-            "status": 1,
-            "created_at": 1,
-            "updated_at": 1,
-            "resume": {
-                "$cond": {
-                    "if": {"$gt": [{"$size": "$resume_data"}, 0]},
-                    "then": {
-                        "id": {"$toString": {"$arrayElemAt": ["$resume_data._id", 0]}},
-                        "filename": {"$arrayElemAt": ["$resume_data.filename", 0]}
-                    },
-                    "else": {
-                        "id": "$resume_id",
-                        "filename": ""
-                    }
-                }
-            },
-            "cover_letter": {
-                "$cond": {
-                    "if": {"$gt": [{"$size": "$cover_letter_data"}, 0]},
-                    "then": {
-                        "id": {"$toString": {"$arrayElemAt": ["$cover_letter_data._id", 0]}},
-                        "name": {"$arrayElemAt": ["$cover_letter_data.name", 0]},
-                        "content": {"$arrayElemAt": ["$cover_letter_data.content", 0]}
-                    },
-                    "else": {
-                        "id": "$cover_letter_id",
-                        "name": "",
-                        "content": ""
-                    }
-                }
-            },
-            "job_query": {
-                "$cond": {
-                    "if": {"$gt": [{"$size": "$job_query_data"}, 0]},
-                    "then": {
-                        "id": {"$toString": {"$arrayElemAt": ["$job_query_data._id", 0]}},
-                        "name": {"$arrayElemAt": ["$job_query_data.name", 0]},
-                        "query": {"$arrayElemAt": ["$job_query_data.query", 0]}
-                    },
-                    "else": {
-                        "id": "$job_query_id",
-                        "name": "",
-                        "query": ""
-                    }
-                }
-            }
-        }}
+        *_JOB_FLOW_PIPELINE_TAIL
     ]
     
-    # Execute the aggregation pipeline
-    cursor = db.job_flows.aggregate(pipeline)
-    job_flows = await cursor.to_list(length=per_page)
+    # Execute the aggregation pipeline; documents already have their final shape
+    cursor = db.job_flows.aggregate(pipeline, batchSize=per_page)
     
-    # Process results to ensure correct field names
-    processed_job_flows = []
-    for job_flow in job_flows:
-        job_flow_dict = {
-            "id": str(job_flow["_id"]),
-            "user_id": job_flow["user_id"],
-            "source": job_flow["source"],
-            "status": job_flow["status"],
-            "created_at": job_flow["created_at"],
-            "updated_at": job_flow["updated_at"],
-            "resume": job_flow["resume"],
-            "cover_letter": job_flow["cover_letter"],
-            "job_query": job_flow["job_query"]
-        }
-        processed_job_flows.append(job_flow_dict)
+    # Count and fetch the page concurrently. $facet would save a round-trip,
+    # but its sub-pipelines cannot use indexes, so both stay separate queries.
+    total, job_flows = await asyncio.gather(
+        count_documents_hinted(db.job_flows, match_stage),
+        cursor.to_list(length=per_page)
+    )
     
     return {
-        "list": processed_job_flows,
+        "list": job_flows,
         "pagination": {
             "total": total,
             "currentPage": page,
-            "totalPages": (total + per_page - 1) // per_page,
+            "totalPages": (total + per_page - 1) // per_page if total is not None else None,
             "perPage": per_page
         }
     }
 
-@router.get("/list", response_model=Dict[str, Any])
+@router.get("/list", responses={200: {"model": JobFlowListResponse}})
 async def list_job_flows(
     page: int = 1,
     per_page: int = 10,
-    status: Optional[JobFlowStatus] = None,
+    status_filter: Optional[JobFlowStatus] = Query(None, alias="status"),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -180,19 +143,21 @@ async def list_job_flows(
     Args:
         page: Page number (1-based)
         per_page: Number of items per page
-        status: Optional job flow status filter
+        status_filter: Optional job flow status filter
         current_user: Current authenticated user
         
     Returns:
         Dictionary with list of job flows and pagination info
     """
     try:
-        return await get_job_flows_by_user(
-            user_id=str(current_user.id),
+        # The pipeline already returns the final shape, so the result is
+        # serialized directly instead of going through response_model validation
+        return ORJSONResponse(await get_job_flows_by_user(
+            user_id=current_user.id,
             page=page,
             per_page=per_page,
-            status=status
-        )
+            status=status_filter
+        ))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -202,7 +167,8 @@ async def list_job_flows(
 @router.post("", response_model=JobFlow, status_code=status.HTTP_201_CREATED)
 async def create_job_flow(
     job_flow: JobFlowCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Create new job flow
@@ -210,18 +176,17 @@ async def create_job_flow(
     Args:
         job_flow: Job flow data
         current_user: Current authenticated user
+        db: Database connection
         
     Returns:
         Created job flow
     """
     try:
-        db = get_db()
-        
         # Check if resume exists and belongs to the user
         resume = await db.resumes.find_one({
-            "_id": ObjectId(job_flow.resume_id),
-            "user_id": str(current_user.id)
-        })
+            "_id": parse_object_id(job_flow.resume_id, "Invalid resume ID format"),
+            "user_id": current_user.id
+        }, snapshot_projection("resume"))
         if not resume:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -230,9 +195,9 @@ async def create_job_flow(
         
         # Check if cover letter exists and belongs to the user
         cover_letter = await db.cover_letters.find_one({
-            "_id": ObjectId(job_flow.cover_letter_id),
-            "user_id": str(current_user.id)
-        })
+            "_id": parse_object_id(job_flow.cover_letter_id, "Invalid cover letter ID format"),
+            "user_id": current_user.id
+        }, snapshot_projection("cover_letter"))
         if not cover_letter:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -241,9 +206,9 @@ async def create_job_flow(
         
         # Check if job query exists and belongs to the user
         job_query = await db.job_queries.find_one({
-            "_id": ObjectId(job_flow.job_query_id),
-            "user_id": str(current_user.id)
-        })
+            "_id": parse_object_id(job_flow.job_query_id, "Invalid job query ID format"),
+            "user_id": current_user.id
+        }, snapshot_projection("job_query"))
         if not job_query:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -252,11 +217,21 @@ async def create_job_flow(
         
         # Create job flow
         job_flow_data = job_flow.model_dump()
-        job_flow_data["user_id"] = str(current_user.id)
-        job_flow_data["created_at"] = job_flow_data["updated_at"] = datetime.utcnow()
+        job_flow_data["user_id"] = current_user.id
+        job_flow_data["created_at"] = job_flow_data["updated_at"] = utc_now()
+        # Store canonical reference ids so snapshot updates find this flow
+        job_flow_data["resume_id"] = str(resume["_id"])
+        job_flow_data["cover_letter_id"] = str(cover_letter["_id"])
+        job_flow_data["job_query_id"] = str(job_query["_id"])
+        job_flow_data["resume_snapshot"] = build_snapshot("resume", resume)
+        job_flow_data["cover_letter_snapshot"] = build_snapshot("cover_letter", cover_letter)
+        job_flow_data["job_query_snapshot"] = build_snapshot("job_query", job_query)
         
-        result = await db.job_flows.insert_one(job_flow_data)
-        job_flow_data["id"] = str(result.inserted_id)
+        # Assign _id up front so the insert can be retried without duplicates
+        new_id = ObjectId()
+        job_flow_data["_id"] = new_id
+        await db.job_flows.insert_one(job_flow_data)
+        job_flow_data["id"] = str(new_id)
         
         return JobFlow(**job_flow_data)
     except HTTPException:
@@ -267,55 +242,121 @@ async def create_job_flow(
             detail=str(e)
         )
 
+async def _get_owned_refs(
+    db,
+    name: str,
+    collection: str,
+    ids: List[str],
+    user_id: str
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch referenced documents owned by the user in a single query
+    
+    Returns:
+        Mapping of requested ID to document with snapshot fields
+    """
+    label = name.replace("_", " ")
+    object_ids = {ref_id: parse_object_id(ref_id, f"Invalid {label} ID format") for ref_id in ids}
+    cursor = db[collection].find(
+        {"_id": {"$in": list(set(object_ids.values()))}, "user_id": user_id},
+        snapshot_projection(name)
+    )
+    docs = {doc["_id"]: doc async for doc in cursor}
+    if any(object_id not in docs for object_id in object_ids.values()):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{label.capitalize()} not found or access denied"
+        )
+    return {ref_id: docs[object_id] for ref_id, object_id in object_ids.items()}
+
+@router.post("/batch", response_model=List[JobFlow], status_code=status.HTTP_201_CREATED)
+async def create_job_flows_batch(
+    job_flows: List[JobFlowCreate] = Body(..., max_length=MAX_JOB_FLOW_BATCH),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    Create several job flows at once
+    
+    Args:
+        job_flows: List of job flow data, at most MAX_JOB_FLOW_BATCH items
+        current_user: Current authenticated user
+        db: Database connection
+        
+    Returns:
+        Created job flows
+    """
+    try:
+        if not job_flows:
+            return []
+        
+        user_id = current_user.id
+        
+        # Check ownership with one query per referenced collection
+        resumes, cover_letters, job_queries = await asyncio.gather(
+            _get_owned_refs(db, "resume", "resumes", [jf.resume_id for jf in job_flows], user_id),
+            _get_owned_refs(db, "cover_letter", "cover_letters", [jf.cover_letter_id for jf in job_flows], user_id),
+            _get_owned_refs(db, "job_query", "job_queries", [jf.job_query_id for jf in job_flows], user_id)
+        )
+        
+        now = utc_now()
+        docs = []
+        for job_flow in job_flows:
+            job_flow_data = job_flow.model_dump()
+            job_flow_data["_id"] = ObjectId()
+            job_flow_data["user_id"] = user_id
+            job_flow_data["created_at"] = job_flow_data["updated_at"] = now
+            job_flow_data["resume_id"] = str(resumes[job_flow.resume_id]["_id"])
+            job_flow_data["cover_letter_id"] = str(cover_letters[job_flow.cover_letter_id]["_id"])
+            job_flow_data["job_query_id"] = str(job_queries[job_flow.job_query_id]["_id"])
+            job_flow_data["resume_snapshot"] = build_snapshot("resume", resumes[job_flow.resume_id])
+            job_flow_data["cover_letter_snapshot"] = build_snapshot("cover_letter", cover_letters[job_flow.cover_letter_id])
+            job_flow_data["job_query_snapshot"] = build_snapshot("job_query", job_queries[job_flow.job_query_id])
+            docs.append(job_flow_data)
+        
+        await db.job_flows.insert_many(docs, ordered=False)
+        
+        for job_flow_data in docs:
+            job_flow_data["id"] = str(job_flow_data["_id"])
+        return [JobFlow(**job_flow_data) for job_flow_data in docs]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
 @router.delete("/{job_flow_id}", status_code=status.HTTP_200_OK)
 async def delete_job_flow(
     job_flow_id: str,
-    current_user: User = Depends(get_current_user)
+    object_id: ObjectId = Depends(_job_flow_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Delete job flow
     
     Args:
         job_flow_id: Job flow ID
+        object_id: Parsed job flow ID
         current_user: Current authenticated user
+        db: Database connection
         
     Returns:
         Success message
     """
     try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(job_flow_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid job flow ID format"
-            )
-        
-        # Check if job flow exists and belongs to the user
-        job_flow = await db.job_flows.find_one({
-            "_id": object_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if not job_flow:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Job flow not found or access denied"
-            )
-        
-        # Delete job flow
+        # Delete job flow if it exists and belongs to the user
         result = await db.job_flows.delete_one({
             "_id": object_id,
-            "user_id": str(current_user.id)
+            "user_id": current_user.id
         })
         
         if result.deleted_count == 0:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to delete job flow"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Job flow not found or access denied"
             )
         
         return {"message": "Job flow successfully deleted", "id": job_flow_id}
@@ -331,7 +372,9 @@ async def delete_job_flow(
 async def update_job_flow_status(
     job_flow_id: str,
     status_update: JobFlowStatusUpdate,
-    current_user: User = Depends(get_current_user)
+    object_id: ObjectId = Depends(_job_flow_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Update job flow status
@@ -339,28 +382,19 @@ async def update_job_flow_status(
     Args:
         job_flow_id: Job flow ID
         status_update: New status
+        object_id: Parsed job flow ID
         current_user: Current authenticated user
+        db: Database connection
         
     Returns:
         Updated job flow
     """
     try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(job_flow_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid job flow ID format"
-            )
-        
         # Check if job flow exists and belongs to the user
         job_flow = await db.job_flows.find_one({
             "_id": object_id,
-            "user_id": str(current_user.id)
-        })
+            "user_id": current_user.id
+        }, {"_id": 1})
         
         if not job_flow:
             raise HTTPException(
@@ -374,7 +408,7 @@ async def update_job_flow_status(
             {
                 "$set": {
                     "status": status_update.status,
-                    "updated_at": datetime.utcnow()
+                    "updated_at": utc_now()
                 }
             }
         )
@@ -387,9 +421,8 @@ async def update_job_flow_status(
         
         # Get updated job flow
         updated_job_flow = await db.job_flows.find_one({"_id": object_id})
-        updated_job_flow["id"] = str(updated_job_flow.pop("_id"))
         
-        return JobFlow(**updated_job_flow)
+        return _job_flow_from_doc(updated_job_flow)
     except HTTPException:
         raise
     except Exception as e:
@@ -1,23 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
+from fastapi.responses import ORJSONResponse
 from models.job_queries import (
     JobQueryGenerateRequest, 
     JobQueryResponse,
+    JobQueryBatchGenerateRequest,
+    JobQueryBatchItem,
     JobQueryCreate,
     JobQueryUpdate,
     JobQueryStatusUpdate,
     JobQuery,
-    JobQueryStatus
+    JobQueryKeywords,
+    JobQueryStatus,
+    JobQueryListResponse
 )
 from models.users import User
+from models.resumes import RESUME_SERVICE_FIELDS
 from core.auth import get_current_user
-from core.claude_client import ClaudeClient
+from core.validation import valid_object_id, parse_object_id
+from core.claude_client import ClaudeClient, get_claude_client
+from core.resume_processor import ensure_resume_processed
+from core.job_flow_snapshots import update_job_flow_snapshots, empty_snapshot
 from bson import ObjectId
-from core.database import get_db
-from typing import Dict, Any, Optional
+from pymongo import ReturnDocument
+from core.database import get_db, count_documents_hinted
+from core.cache import TTLCache
+from typing import Dict, Any, Optional, List
+from core.clock import utc_now
 from datetime import datetime
+import asyncio
 
 router = APIRouter(tags=["job-queries"])
 
+_job_query_id = valid_object_id("query_id", "Invalid job query ID format")
+
+_JOB_QUERY_SORT = {
+    "status": 1,  # 1 for ascending, to have "active" first
+    "created_at": -1  # -1 for descending, to have newest first
+}
+
+# Request-independent part of the list pipeline, built once at import time.
+# Projects only the fields of JobQuery.
+_JOB_QUERY_PIPELINE_TAIL = [
+    {"$project": {
+        "_id": 0,
+        "id": {"$toString": "$_id"},
+        "user_id": 1,
+        "name": 1,
+        "keywords": 1,
+        "query": 1,
+        "status": {"$ifNull": ["$status", JobQueryStatus.ARCHIVED.value]},
+        "created_at": {"$ifNull": ["$created_at", "$$NOW"]},
+        "updated_at": {"$ifNull": ["$updated_at", "$$NOW"]}
+    }}
+]
+
+# Generated keywords keyed by user, resume and resume version
+_keywords_cache = TTLCache(ttl=3600)
+
+# Resume service fields that are not passed to Claude as candidate data
+_CANDIDATE_PROJECTION = dict.fromkeys(RESUME_SERVICE_FIELDS, 0)
+
+# Same fields minus _id, updated_at and processing_status, which batch generation
+# needs for matching, caching and checking that candidate data is available
+_BATCH_CANDIDATE_PROJECTION = dict.fromkeys(RESUME_SERVICE_FIELDS - {"_id", "updated_at", "processing_status"}, 0)
+
+# Maximum concurrent Claude calls per batch request
+_BATCH_CONCURRENCY = 8
+
+def _keywords_cache_key(user_id: str, resume_id: ObjectId, updated_at: Optional[datetime]) -> str:
+    """Cache key for generated keywords of a resume version"""
+    return f"jq:{user_id}:{resume_id}:{updated_at.timestamp() if updated_at else ''}"
+
+def _job_query_from_doc(doc: Dict[str, Any]) -> JobQuery:
+    """Build JobQuery from a stored document, skipping Pydantic validation"""
+    now = utc_now()
+    return JobQuery.model_construct(
+        id=str(doc["_id"]),
+        user_id=doc["user_id"],
+        name=doc["name"],
+        keywords=JobQueryKeywords.model_construct(**doc["keywords"]),
+        query=doc["query"],
+        status=JobQueryStatus(doc.get("status", JobQueryStatus.ARCHIVED)),
+        created_at=doc.get("created_at", now),
+        updated_at=doc.get("updated_at", now)
+    )
+
 async def get_job_queries_by_user(
     user_id: str,
     page: int = 1,
@@ -44,46 +111,37 @@ async def get_job_queries_by_user(
     if status is not None:
         query["status"] = status
     
-    # Get total number of documents
-    total = await db.job_queries.count_documents(query)
-    
-    # Get documents with pagination
-    cursor = db.job_queries.find(query).sort([
-        ("status", 1),  # 1 for ascending, to have "active" first
-        ("created_at", -1)  # -1 for descending, to have newest first
-    ]).skip(skip).limit(per_page)
-    queries = await cursor.to_list(length=per_page)
-    
-    # Convert ObjectId to strings
-    processed_queries = []
-    for query in queries:
-        query_dict = {
-            "id": str(query["_id"]),
-            "user_id": query["user_id"],
-            "name": query["name"],
-            "keywords": query["keywords"],
-            "query": query["query"],
-            "status": query.get("status", JobQueryStatus.ARCHIVED),
-            "created_at": query.get("created_at", datetime.utcnow()),
-            "updated_at": query.get("updated_at", datetime.utcnow())
-        }
-        processed_queries.append(query_dict)
+    # Get documents with pagination, converting ObjectId to string on the server
+    pipeline = [
+        {"$match": query},
+        {"$sort": _JOB_QUERY_SORT},
+        {"$skip": skip},
+        {"$limit": per_page},
+        *_JOB_QUERY_PIPELINE_TAIL
+    ]
+    cursor = db.job_queries.aggregate(pipeline, batchSize=per_page)
+    
+    # Count and fetch the page concurrently
+    total, queries = await asyncio.gather(
+        count_documents_hinted(db.job_queries, query),
+        cursor.to_list(length=per_page)
+    )
     
     return {
-        "list": processed_queries,
+        "list": queries,
         "pagination": {
             "total": total,
             "currentPage": page,
-            "totalPages": (total + per_page - 1) // per_page,
+            "totalPages": (total + per_page - 1) // per_page if total is not None else None,
             "perPage": per_page
         }
     }
 
-@router.get("/list", response_model=Dict[str, Any])
+@router.get("/list", responses={200: {"model": JobQueryListResponse}})
 async def list_job_queries(
     page: int = 1,
     per_page: int = 10,
-    status: Optional[JobQueryStatus] = None,
+    status_filter: Optional[JobQueryStatus] = Query(None, alias="status"),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -92,29 +150,26 @@ async def list_job_queries(
     Args:
         page: Page number (1-based)
         per_page: Number of items per page
-        status: Optional job query status filter
+        status_filter: Optional job query status filter
         current_user: Current authenticated user
         
     Returns:
         Dictionary with list of queries and pagination info
     """
-    try:
-        return await get_job_queries_by_user(
-            user_id=str(current_user.id),
-            page=page,
-            per_page=per_page,
-            status=status
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
+    # The pipeline already returns the final shape, so the result is
+    # serialized directly instead of going through response_model validation
+    return ORJSONResponse(await get_job_queries_by_user(
+        user_id=current_user.id,
+        page=page,
+        per_page=per_page,
+        status=status_filter
+    ))
 
 @router.post("", response_model=JobQuery, status_code=status.HTTP_201_CREATED)
 async def create_job_query(
     query: JobQueryCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Create new job query
@@ -122,78 +177,65 @@ async def create_job_query(
     Args:
         query: Job query data
         current_user: Current authenticated user
+        db: Database connection
         
     Returns:
         Created job query
     """
-    try:
-        db = get_db()
-        query_data = query.model_dump()
-        query_data["user_id"] = str(current_user.id)
-        query_data["created_at"] = query_data["updated_at"] = datetime.utcnow()
-        
-        result = await db.job_queries.insert_one(query_data)
-        query_data["id"] = str(result.inserted_id)
-        
-        return JobQuery(**query_data)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
+    now = utc_now()
+    query_data = {
+        # Assign _id up front so the insert can be retried without duplicates
+        "_id": ObjectId(),
+        **query.model_dump(),
+        "user_id": current_user.id,
+        "created_at": now,
+        "updated_at": now
+    }
+    await db.job_queries.insert_one(query_data)
+    
+    # Input is already validated, so build the response without a second pass
+    return _job_query_from_doc(query_data)
 
 @router.get("/{query_id}", response_model=JobQuery)
 async def get_job_query(
     query_id: str,
-    current_user: User = Depends(get_current_user)
+    object_id: ObjectId = Depends(_job_query_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Get job query by ID
     
     Args:
         query_id: Job query ID
+        object_id: Parsed job query ID
         current_user: Current authenticated user
+        db: Database connection
         
     Returns:
         Job query data
     """
-    try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(query_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid job query ID format"
-            )
-        
-        query = await db.job_queries.find_one({
-            "_id": object_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if not query:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Job query not found or access denied"
-            )
-            
-        return JobQuery(**{**query, "id": str(query.pop("_id"))})
-    except HTTPException:
-        raise
-    except Exception as e:
+    query = await db.job_queries.find_one({
+        "_id": object_id,
+        "user_id": current_user.id
+    })
+    
+    if not query:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job query not found or access denied"
         )
+        
+    return _job_query_from_doc(query)
 
 @router.patch("/{query_id}", response_model=JobQuery)
 async def update_job_query(
     query_id: str,
     query_update: JobQueryUpdate,
-    current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    object_id: ObjectId = Depends(_job_query_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Update job query
@@ -201,57 +243,46 @@ async def update_job_query(
     Args:
         query_id: Job query ID
         query_update: Update data
+        background_tasks: Tasks run after the response is sent
+        object_id: Parsed job query ID
         current_user: Current authenticated user
+        db: Database connection
         
     Returns:
         Updated job query
     """
-    try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(query_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid job query ID format"
-            )
-        
-        update_data = query_update.model_dump(exclude_unset=True)
-        update_data["updated_at"] = datetime.utcnow()
-        
-        result = await db.job_queries.update_one(
-            {
-                "_id": object_id,
-                "user_id": str(current_user.id)
-            },
-            {"$set": update_data}
-        )
-        
-        if result.matched_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Job query not found or access denied"
-            )
-            
-        updated_query = await db.job_queries.find_one({
-            "_id": object_id
-        })
-        return JobQuery(**{**updated_query, "id": str(updated_query.pop("_id"))})
-    except HTTPException:
-        raise
-    except Exception as e:
+    update_data = query_update.model_dump(exclude_unset=True)
+    update_data["updated_at"] = utc_now()
+    
+    updated_query = await db.job_queries.find_one_and_update(
+        {
+            "_id": object_id,
+            "user_id": current_user.id
+        },
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if updated_query is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job query not found or access denied"
         )
+    
+    # Keep job flows that use this job query in sync after the response
+    background_tasks.add_task(update_job_flow_snapshots, db, "job_query", str(object_id), {
+        field: update_data[field] for field in ("name", "query") if field in update_data
+    })
+    
+    return _job_query_from_doc(updated_query)
 
 @router.patch("/{query_id}/status", response_model=JobQuery)
 async def update_job_query_status(
     query_id: str,
     status_update: JobQueryStatusUpdate,
-    current_user: User = Depends(get_current_user)
+    object_id: ObjectId = Depends(_job_query_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Update job query status
@@ -259,105 +290,80 @@ async def update_job_query_status(
     Args:
         query_id: Job query ID
         status_update: New status
+        object_id: Parsed job query ID
         current_user: Current authenticated user
+        db: Database connection
         
     Returns:
         Updated job query
     """
-    try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(query_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid job query ID format"
-            )
-        
-        result = await db.job_queries.update_one(
-            {
-                "_id": object_id,
-                "user_id": str(current_user.id)
-            },
-            {
-                "$set": {
-                    "status": status_update.status,
-                    "updated_at": datetime.utcnow()
-                }
+    updated_query = await db.job_queries.find_one_and_update(
+        {
+            "_id": object_id,
+            "user_id": current_user.id
+        },
+        {
+            "$set": {
+                "status": status_update.status,
+                "updated_at": utc_now()
             }
-        )
-        
-        if result.matched_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Job query not found or access denied"
-            )
-            
-        updated_query = await db.job_queries.find_one({
-            "_id": object_id
-        })
-        return JobQuery(**{**updated_query, "id": str(updated_query.pop("_id"))})
-    except HTTPException:
-        raise
-    except Exception as e:
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if updated_query is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job query not found or access denied"
         )
+        
+    return _job_query_from_doc(updated_query)
 
 @router.delete("/{query_id}", status_code=status.HTTP_200_OK)
 async def delete_job_query(
     query_id: str,
-    current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    object_id: ObjectId = Depends(_job_query_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
     Delete job query
     
     Args:
         query_id: Job query ID
+        background_tasks: Tasks run after the response is sent
+        object_id: Parsed job query ID
         current_user: Current authenticated user
+        db: Database connection
         
     Returns:
         Success message
     """
-    try:
-        db = get_db()
-        
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(query_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid job query ID format"
-            )
-        
-        result = await db.job_queries.delete_one({
-            "_id": object_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if result.deleted_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Job query not found or access denied"
-            )
-            
-        return {"message": "Job query deleted successfully"}
-    except HTTPException:
-        raise
-    except Exception as e:
+    result = await db.job_queries.delete_one({
+        "_id": object_id,
+        "user_id": current_user.id
+    })
+    
+    if result.deleted_count == 0:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job query not found or access denied"
         )
+        
+    # Job flows that use this job query are updated after the response
+    background_tasks.add_task(
+        update_job_flow_snapshots, db, "job_query", str(object_id), empty_snapshot("job_query")
+    )
+    
+    return {"message": "Job query deleted successfully"}
 
 @router.post("/generate", response_model=JobQueryResponse)
 async def generate_job_query(
     request: JobQueryGenerateRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db),
+    claude_client: ClaudeClient = Depends(get_claude_client)
 ):
     """
     Generate job query keywords based on resume data
@@ -365,52 +371,112 @@ async def generate_job_query(
     Args:
         request: Request with resume_id
         current_user: Current user
+        db: Database connection
+        claude_client: Shared Claude client
         
     Returns:
         Generated keywords for job search
     """
-    try:
-        db = get_db()
-        claude_client = ClaudeClient()
-        
-        # Check ObjectId validity
-        try:
-            resume_id = ObjectId(request.resume_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid resume ID format"
-            )
-        
-        # Get resume and check access rights
-        resume = await db.resumes.find_one({
+    # Check ObjectId validity
+    resume_id = parse_object_id(request.resume_id, "Invalid resume ID format")
+    
+    # Check access rights and read resume version with a cheap projection
+    resume = await db.resumes.find_one({
+        "_id": resume_id,
+        "user_id": current_user.id
+    }, {"updated_at": 1, "processing_status": 1})
+    
+    if resume is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resume not found or access denied"
+        )
+    ensure_resume_processed(resume)
+    
+    # Keywords only change when the resume does, so cache by its updated_at
+    cache_key = _keywords_cache_key(current_user.id, resume_id, resume.get("updated_at"))
+    keywords = _keywords_cache.get(cache_key)
+    if keywords is None:
+        # Get candidate data, leaving out service fields
+        candidate_data = await db.resumes.find_one({
             "_id": resume_id,
-            "user_id": str(current_user.id)
-        })
+            "user_id": current_user.id
+        }, _CANDIDATE_PROJECTION)
         
-        if not resume:
+        if candidate_data is None:
+            # Deleted after the first lookup
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Resume not found or access denied"
             )
         
-        # Extract candidate data from resume, excluding service fields
-        candidate_data = {
-            k: v for k, v in resume.items() 
-            if k not in ["_id", "user_id", "filename", "file_id", "status", "created_at", "updated_at"]
-        }
-        
         # Generate keywords using Claude
         keywords = await claude_client.generate_job_query_keywords(
             candidate_data=candidate_data
         )
+        _keywords_cache.set(cache_key, keywords)
+    
+    return JobQueryResponse(keywords=keywords)
+
+@router.post("/generate/batch", response_model=List[JobQueryBatchItem])
+async def generate_job_queries_batch(
+    request: JobQueryBatchGenerateRequest,
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db),
+    claude_client: ClaudeClient = Depends(get_claude_client)
+):
+    """
+    Generate job query keywords for several resumes concurrently
+    
+    Args:
+        request: Request with resume_ids
+        current_user: Current user
+        db: Database connection
+        claude_client: Shared Claude client
         
-        return JobQueryResponse(keywords=keywords)
-        
-    except HTTPException:
-        raise
-    except Exception as e:
+    Returns:
+        Generated keywords for each resume
+    """
+    # Check ObjectId validity; duplicates are generated once
+    resume_ids = list(dict.fromkeys(
+        parse_object_id(resume_id, "Invalid resume ID format")
+        for resume_id in request.resume_ids
+    ))
+    
+    # Get all resumes in one query and check access rights
+    cursor = db.resumes.find({
+        "_id": {"$in": resume_ids},
+        "user_id": current_user.id
+    }, _BATCH_CANDIDATE_PROJECTION)
+    resumes = {resume["_id"]: resume async for resume in cursor}
+    
+    if any(resume_id not in resumes for resume_id in resume_ids):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        ) 
\ No newline at end of file
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resume not found or access denied"
+        )
+    for resume in resumes.values():
+        ensure_resume_processed(resume)
+    
+    semaphore = asyncio.Semaphore(_BATCH_CONCURRENCY)
+    
+    async def generate(resume_id: ObjectId) -> JobQueryKeywords:
+        candidate_data = dict(resumes[resume_id])
+        candidate_data.pop("_id")
+        candidate_data.pop("processing_status", None)
+        cache_key = _keywords_cache_key(current_user.id, resume_id, candidate_data.pop("updated_at", None))
+        keywords = _keywords_cache.get(cache_key)
+        if keywords is None:
+            async with semaphore:
+                keywords = await claude_client.generate_job_query_keywords(
+                    candidate_data=candidate_data
+                )
+            _keywords_cache.set(cache_key, keywords)
+        return keywords
+    
+    results = await asyncio.gather(*[generate(resume_id) for resume_id in resume_ids])
+    
+    return [
+        JobQueryBatchItem(resume_id=str(resume_id), keywords=keywords)
+        for resume_id, keywords in zip(resume_ids, results)
+    ]
@@ -1,226 +1,443 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Response, Form
-from models import Resume, User, ResumeStatusUpdate, ResumeScoringRequest
-from models.resumes import ResumeStatus
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query, Response, Form, Header, BackgroundTasks
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from models import Resume, User, ResumeStatusUpdate, ResumeScoringRequest, ResumeProcessingInfo, ResumeListResponse
+from models.resumes import ResumeStatus, ResumeProcessingStatus, RESUME_SERVICE_FIELDS
 from core.auth import get_current_user
-from core.storage import save_file_content, get_file, is_allowed_file, ALLOWED_EXTENSIONS
+from core.validation import valid_object_id, parse_object_id
+from core.storage import save_upload, open_file_stream, iter_file_chunks, delete_file, release_file, get_file_extension, is_allowed_file, ALLOWED_EXTENSIONS, RESUME_EXTENSIONS, MAX_FILE_SIZE
 from core.database import get_db
-from core.resume_processor import process_resume
-from core.claude_client import ClaudeClient
+from core.cache import TTLCache
+from core.resume_processor import process_resume, ensure_resume_processed
+from core.claude_client import ClaudeClient, get_claude_client
+from core.job_flow_snapshots import update_job_flow_snapshots, empty_snapshot
 from datetime import datetime
+from core.clock import utc_now
+import asyncio
+import base64
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from bson import ObjectId
-import os
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
 
 router = APIRouter(tags=["resumes"])
 logger = logging.getLogger(__name__)
 
+_resume_id = valid_object_id("resume_id", "Invalid resume ID format")
+
+# Fields returned by the list endpoint; skips the parsed resume content
+_RESUME_LIST_PROJECTION = {
+    "user_id": 1,
+    "filename": 1,
+    "file_id": 1,
+    "status": 1,
+    "created_at": 1,
+    "scoring": 1,
+    "processing_status": 1
+}
+
+# Scoring returned for resumes that have not been scored yet
+_DEFAULT_SCORING = {
+    "total_score": 0,
+    "sections_score": 0,
+    "experience_score": 0,
+    "education_score": 0,
+    "timeline_score": 0,
+    "language_score": 0
+}
+
+# Values for list fields missing in older documents
+_RESUME_LIST_DEFAULTS = {
+    "file_id": "",
+    "status": ResumeStatus.ARCHIVED,
+    "scoring": _DEFAULT_SCORING,
+    "processing_status": ResumeProcessingStatus.COMPLETED
+}
+
+# Resume totals per (user_id, status); dropped whenever a user's resumes change
+_resume_count_cache = TTLCache(ttl=30, maxsize=10_000)
+
+def _invalidate_resume_count(user_id: str) -> None:
+    """Drop cached resume totals for all status filters of the user"""
+    for status_value in (None, *ResumeStatus):
+        _resume_count_cache.delete((user_id, status_value))
+
+async def _count_resumes(db, user_id: str, status_value: Optional[ResumeStatus] = None) -> int:
+    """Count user's resumes, using the cached total when available"""
+    total = _resume_count_cache.get((user_id, status_value))
+    if total is None:
+        query = {"user_id": user_id}
+        if status_value is not None:
+            query["status"] = status_value
+        total = await db.resumes.count_documents(query)
+        _resume_count_cache.set((user_id, status_value), total)
+    return total
+
+async def _resume_list_changed(db, user_id: str) -> None:
+    """
+    Drop cached resume totals of the user and bump the user's resume list version.
+    Called after every write that changes what the resume list returns.
+    """
+    _invalidate_resume_count(user_id)
+    await db.users.update_one(
+        {"_id": ObjectId(user_id)},
+        {"$inc": {"resume_list_version": 1}}
+    )
+
+async def _resume_list_etag(db, user_id: str, *params: Any) -> str:
+    """
+    Build ETag for a resume list page from the user's resume list version.
+    The version lives in the database, so a change handled by any worker
+    invalidates the ETag, and checking it costs a single lookup by _id.
+    
+    Args:
+        db: Database connection
+        user_id: User ID
+        params: Query parameters selecting the page
+    """
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"resume_list_version": 1})
+    version = user.get("resume_list_version", 0) if user else 0
+    digest = hashlib.md5(f"{version}:{params}".encode()).hexdigest()
+    return f'W/"{digest}"'
+
+def _encode_resume_cursor(resume: Dict[str, Any]) -> str:
+    """
+    Build opaque cursor pointing right after the given resume in list order.
+    Older documents may lack status or created_at; those are encoded empty.
+    """
+    created_at = resume.get("created_at")
+    raw = f'{resume.get("status") or ""}|{created_at.isoformat() if created_at else ""}|{resume["_id"]}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_resume_cursor(cursor: str) -> Tuple[Optional[str], Optional[datetime], ObjectId]:
+    """
+    Parse cursor built by _encode_resume_cursor.
+    
+    Returns:
+        Tuple (status, created_at, _id) of the last resume of the previous page;
+        status and created_at are None when the resume had none
+    """
+    try:
+        last_status, created_at, resume_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (
+            last_status or None,
+            datetime.fromisoformat(created_at) if created_at else None,
+            ObjectId(resume_id)
+        )
+    except (ValueError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def _resume_cursor_filter(
+    last_status: Optional[str],
+    last_created_at: Optional[datetime],
+    last_id: ObjectId
+) -> Dict[str, Any]:
+    """
+    Filter for resumes that sort after the cursor position.
+    In (status asc, created_at desc, _id desc) order a missing status sorts
+    first and a missing created_at sorts last, so both are matched explicitly.
+    """
+    if last_created_at is None:
+        same_status_after = [{"created_at": None, "_id": {"$lt": last_id}}]
+    else:
+        same_status_after = [
+            {"created_at": {"$lt": last_created_at}},
+            {"created_at": None},
+            {"created_at": last_created_at, "_id": {"$lt": last_id}}
+        ]
+    later_status = {"$ne": None} if last_status is None else {"$gt": last_status}
+    return {"$or": [
+        {"status": later_status},
+        *({"status": last_status, **condition} for condition in same_status_after)
+    ]}
+
 async def get_resumes_by_user(
     user_id: str,
     page: int = 1,
     per_page: int = 10,
-    status: Optional[ResumeStatus] = None
+    status_value: Optional[ResumeStatus] = None,
+    cursor: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Get user's resumes with pagination.
     Sort by status (active first) and creation date (newest to oldest).
     
+    With a cursor the page starts right after the resume encoded in it
+    (keyset pagination), so deep pages are an index seek instead of a skip.
+    The total is only counted for offset pages, since cursor pages follow
+    a first page that already has it.
+    
     Args:
         user_id: User ID
-        page: Page number
+        page: Page number, ignored when cursor is set
         per_page: Items per page
-        status: Optional resume status filter
+        status_value: Optional resume status filter
+        cursor: Optional pagination.nextCursor of the previous page
     """
-    skip = (page - 1) * per_page
     db = get_db()
     
     # Form search conditions
     query = {"user_id": str(user_id)}
-    if status is not None:
-        query["status"] = status
+    if status_value is not None:
+        query["status"] = status_value
     
-    # Get total number of documents
-    total = await db.resumes.count_documents(query)
+    skip = 0
+    if cursor is not None:
+        last_status, last_created_at, last_id = _decode_resume_cursor(cursor)
+        
+        # Only documents that sort after the last one of the previous page
+        query.update(_resume_cursor_filter(last_status, last_created_at, last_id))
+    else:
+        skip = (page - 1) * per_page
     
     # Get documents with pagination and sorting:
     # 1. By status (active first)
     # 2. By creation date (newest to oldest)
-    cursor = db.resumes.find(query).sort([
+    # 3. By ID to make the order total for keyset pagination
+    # One extra document tells whether there is a next page
+    fetch_page = db.resumes.find(query, _RESUME_LIST_PROJECTION).sort([
         ("status", 1),  # 1 for ascending, to have "active" first (since active < archived alphabetically)
-        ("created_at", -1)  # -1 for descending, to have newest first
-    ]).skip(skip).limit(per_page)
-    resumes = await cursor.to_list(length=per_page)
-    
-    # Convert ObjectId to strings and create dictionaries for each resume
-    processed_resumes = []
-    for resume in resumes:
-        resume_dict = {
-            "id": str(resume["_id"]),
-            "user_id": str(resume["user_id"]),
-            "filename": resume["filename"],
-            "file_id": resume.get("file_id", ""),
-            "status": resume.get("status", ResumeStatus.ARCHIVED),
-            "created_at": resume.get("created_at", datetime.utcnow()),
-            "scoring": resume.get("scoring", {
-                "total_score": 0,
-                "sections_score": 0,
-                "experience_score": 0,
-                "education_score": 0,
-                "timeline_score": 0,
-                "language_score": 0
-            })
-        }
-        processed_resumes.append(resume_dict)
+        ("created_at", -1),  # -1 for descending, to have newest first
+        ("_id", -1)
+    ]).skip(skip).limit(per_page + 1).to_list(length=per_page + 1)
+    
+    if cursor is None:
+        # Count and fetch the page concurrently
+        total, resumes = await asyncio.gather(
+            _count_resumes(db, str(user_id), status_value),
+            fetch_page
+        )
+    else:
+        total, resumes = None, await fetch_page
+    
+    next_cursor = None
+    if len(resumes) > per_page:
+        resumes = resumes[:per_page]
+        next_cursor = _encode_resume_cursor(resumes[-1])
+    
+    # Projected documents already have the response shape; only convert _id
+    # and fill defaults for fields missing in older documents
+    defaults = {**_RESUME_LIST_DEFAULTS, "created_at": utc_now()}
+    processed_resumes = [
+        {"id": str(resume.pop("_id")), **defaults, **resume}
+        for resume in resumes
+    ]
     
     return {
         "list": processed_resumes,
         "pagination": {
             "total": total,
-            "currentPage": page,
-            "totalPages": (total + per_page - 1) // per_page,
-            "perPage": per_page
+            "currentPage": page if cursor is None else None,
+            "totalPages": (total + per_page - 1) // per_page if total is not None else None,
+            "perPage": per_page,
+            "nextCursor": next_cursor
         }
     }
 
-@router.post("/upload", response_model=Resume)
+async def _process_uploaded_resume(resume_id: ObjectId, user_id: str, file_content: bytes, file_extension: str) -> None:
+    """
+    Extract resume data in the background and store it on the resume.
+    
+    Args:
+        resume_id: ID of the uploaded resume
+        user_id: ID of the resume owner
+        file_content: Resume file content
+        file_extension: File extension (with dot)
+    """
+    db = get_db()
+    try:
+        logger.info("Starting resume processing %s", resume_id)
+        processed_data = await process_resume(file_content, file_extension)
+        # Parsed data never overrides system fields set on upload
+        update = {
+            field: value for field, value in processed_data.items()
+            if field not in RESUME_SERVICE_FIELDS
+        }
+        update["processing_status"] = ResumeProcessingStatus.COMPLETED
+    except Exception as e:
+        logger.error("Error processing resume %s: %s", resume_id, e)
+        update = {"processing_status": ResumeProcessingStatus.FAILED}
+    
+    update["updated_at"] = utc_now()
+    await db.resumes.update_one({"_id": resume_id}, {"$set": update})
+    await _resume_list_changed(db, user_id)
+
+@router.post("/upload", response_model=ResumeProcessingInfo, status_code=status.HTTP_202_ACCEPTED)
 async def upload_resume(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    status: ResumeStatus = ResumeStatus.ARCHIVED,
+    status_value: ResumeStatus = Query(ResumeStatus.ARCHIVED, alias="status"),
     current_user: User = Depends(get_current_user),
     db = Depends(get_db)
 ):
     """
     Upload resume and save it to database.
+    The file is stored right away and processed in the background;
+    poll GET /{resume_id}/processing until processing completes.
     
     Args:
+        background_tasks: Tasks run after the response is sent
         file: Resume file
-        status: Optional resume status (default: ARCHIVED)
+        status_value: Optional resume status (default: ARCHIVED)
         current_user: Current user
         db: Database connection
         
     Returns:
-        Resume with information about uploaded resume
+        ID of the uploaded resume and its processing status
     """
-    try:
-        # Check file extension
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        if file_extension not in ['.pdf', '.doc', '.docx']:
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file format. Only PDF, DOC and DOCX are supported"
-            )
-            
-        # Read file content
-        file_content = await file.read()
-        
-        # Save file to GridFS
-        file_id = await save_file_content(file_content, file.filename, str(current_user.id))
-        
-        # Process resume
-        logger.info(f"Starting resume processing {file.filename}")
-        processed_data = await process_resume(file_content, file_extension)
-        
-        # Add system fields
-        resume_data = {
-            **processed_data,
-            "user_id": str(current_user.id),
-            "filename": file.filename,
-            "file_id": file_id,
-            "status": status,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        # Save to database
-        result = await db.resumes.insert_one(resume_data)
-        
-        # Получаем созданное резюме и преобразуем его для возврата
-        created_resume = await db.resumes.find_one({"_id": result.inserted_id})
-        
-        # Создаем словарь для ответа, сохраняя _id как строку
-        resume_dict = dict(created_resume)
-        resume_dict["_id"] = str(result.inserted_id)  # Сохраняем _id как строку
-        
-        logger.info(f"Resume successfully saved to database, ID: {resume_dict['_id']}")
+    # Check file extension
+    file_extension = get_file_extension(file.filename)
+    if file_extension not in RESUME_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported file format. Only PDF, DOC and DOCX are supported"
+        )
         
-        return Resume(**resume_dict)
+    # Save file to GridFS, keeping the content for processing
+    file_id, file_content = await save_upload(file, current_user.id)
+    
+    # Add system fields; parsed data is added once processing completes
+    now = utc_now()
+    resume_data = {
+        "user_id": current_user.id,
+        "filename": file.filename,
+        "file_id": file_id,
+        "status": status_value,
+        "processing_status": ResumeProcessingStatus.PROCESSING,
+        "created_at": now,
+        "updated_at": now
+    }
+    
+    # Save to database
+    result = await db.resumes.insert_one(resume_data)
+    await _resume_list_changed(db, current_user.id)
+    logger.info("Resume successfully saved to database, ID: %s", result.inserted_id)
+    
+    background_tasks.add_task(_process_uploaded_resume, result.inserted_id, current_user.id, file_content, file_extension)
+    
+    return ResumeProcessingInfo(
+        id=str(result.inserted_id),
+        processing_status=ResumeProcessingStatus.PROCESSING
+    )
+
+@router.get("/{resume_id}/processing", response_model=ResumeProcessingInfo)
+async def get_resume_processing_status(
+    resume_id: str,
+    object_id: ObjectId = Depends(_resume_id),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """
+    Get processing status of an uploaded resume
+    
+    Args:
+        resume_id: Resume ID
+        object_id: Parsed resume ID
+        current_user: Current user
+        db: Database connection
         
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error uploading resume: {str(e)}")
+    Returns:
+        Resume ID and processing status
+    """
+    resume = await db.resumes.find_one({
+        "_id": object_id,
+        "user_id": current_user.id
+    }, {"processing_status": 1})
+    
+    if not resume:
         raise HTTPException(
-            status_code=500,
-            detail=f"Error uploading resume: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resume not found"
         )
+    
+    # Resumes uploaded before background processing were processed in the request
+    return ResumeProcessingInfo(
+        id=resume_id,
+        processing_status=resume.get("processing_status", ResumeProcessingStatus.COMPLETED)
+    )
 
-@router.get("/list", response_model=Dict[str, Any])
+@router.get("/list", responses={200: {"model": ResumeListResponse}})
 async def list_resumes(
     page: int = 1,
     per_page: int = 10,
-    status: Optional[ResumeStatus] = None,
-    current_user: User = Depends(get_current_user)
-):
+    status_filter: Optional[ResumeStatus] = Query(None, alias="status"),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
+) -> Response:
     """
-    Get current user's resume list with pagination and status filtering
+    Get current user's resume list with pagination and status filtering.
+    Pass pagination.nextCursor as cursor to get the next page without offsets.
+    Responds with 304 Not Modified when If-None-Match matches the current list.
     """
-    try:
-        return await get_resumes_by_user(
-            user_id=str(current_user.id),
+    etag = await _resume_list_etag(db, current_user.id, page, per_page, status_filter, cursor)
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    # Rows are already plain JSON-safe dicts, so they are serialized
+    # directly instead of going through jsonable_encoder
+    return ORJSONResponse(
+        await get_resumes_by_user(
+            user_id=current_user.id,
             page=page,
             per_page=per_page,
-            status=status
-        )
-    except Exception as e:
-        logger.error(f"Error getting resume list: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error getting resume list"
-        )
+            status_value=status_filter,
+            cursor=cursor
+        ),
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
 
 @router.get("/{resume_id}/download")
 async def download_resume(
     resume_id: str,
-    current_user: User = Depends(get_current_user)
+    object_id: ObjectId = Depends(_resume_id),
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """
-    Download resume
+    Download resume.
+    Files never change once uploaded, so a matching If-None-Match gets 304 Not Modified.
     """
-    try:
-        # Get resume information
-        db = get_db()
-        resume = await db.resumes.find_one({
-            "_id": ObjectId(resume_id),
-            "user_id": str(current_user.id)
-        })
-        
-        if not resume:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Resume not found"
-            )
-        
-        # Get file from GridFS
-        file_content, filename = await get_file(resume["file_id"])
-        
-        # Return file
-        return Response(
-            content=file_content,
-            media_type="application/octet-stream",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error downloading resume: {str(e)}")
+    # Get resume information; deduplicated uploads share a GridFS file,
+    # so the name comes from the resume rather than the file
+    resume = await db.resumes.find_one({
+        "_id": object_id,
+        "user_id": current_user.id
+    }, {"file_id": 1, "filename": 1})
+    
+    if not resume:
         raise HTTPException(
-            status_code=500,
-            detail=f"Error downloading resume: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resume not found"
         )
+    
+    etag = f'"{resume["file_id"]}"'
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable"
+    }
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    
+    # Open file in GridFS without reading it into memory
+    grid_out = await open_file_stream(resume["file_id"])
+    
+    # Stream file chunk by chunk
+    return StreamingResponse(
+        iter_file_chunks(grid_out),
+        media_type="application/octet-stream",
+        headers={
+            "Content-Disposition": f'attachment; filename="{resume.get("filename") or grid_out.filename}"',
+            "Content-Length": str(grid_out.length),
+            **cache_headers
+        }
+    )
 
 @router.post("/test-process")
 async def test_process_resume(
@@ -229,44 +446,49 @@ async def test_process_resume(
     """
     Test endpoint for resume analysis without saving
     """
-    try:
-        # Check file type
-        if not is_allowed_file(file.filename):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-            )
+    # Check file type
+    if not is_allowed_file(file.filename):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
 
-        # Get file extension
-        file_extension = os.path.splitext(file.filename)[1]
-        
-        # Read file content
-        content = await file.read()
-        
-        try:
-            # Analyze resume
-            result = await process_resume(content, file_extension)
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error analyzing resume: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to analyze resume"
-            )
-            
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
+    # Get file extension
+    file_extension = get_file_extension(file.filename)
+    
+    # Read file content, one byte past the limit to detect oversized files
+    content = await file.read(MAX_FILE_SIZE + 1)
+    if len(content) > MAX_FILE_SIZE:
         raise HTTPException(
-            status_code=500,
-            detail="Error processing file"
+            status_code=413,
+            detail=f"File too large. Maximum size: {MAX_FILE_SIZE/1024/1024}MB"
         )
+    
+    # Analyze resume
+    return await process_resume(content, file_extension)
+
+async def _release_resume_file(db, file_id: str) -> None:
+    """
+    Drop a deleted resume's reference to its GridFS file and delete the
+    file once no resume uses it; a failure only leaves an orphaned file.
+    """
+    try:
+        remaining = await release_file(file_id)
+        if remaining is None:
+            # Stored before reference counting; no upload can start sharing
+            # such a file, so counting the resumes that use it is race-free
+            remaining = await db.resumes.count_documents({"file_id": file_id}, limit=1)
+        if remaining <= 0:
+            await delete_file(file_id)
+            logger.info("Resume file deleted from GridFS: %s", file_id)
+    except Exception as e:
+        logger.warning("Failed to delete resume file from GridFS: %s", e)
 
 @router.delete("/{resume_id}", status_code=status.HTTP_200_OK)
 async def delete_resume(
     resume_id: str,
+    background_tasks: BackgroundTasks,
+    object_id: ObjectId = Depends(_resume_id),
     current_user: User = Depends(get_current_user),
     db = Depends(get_db)
 ):
@@ -275,68 +497,45 @@ async def delete_resume(
     
     Args:
         resume_id: Resume ID to delete
+        background_tasks: Tasks run after the response is sent
+        object_id: Parsed resume ID
         current_user: Current user
         db: Database connection
         
     Returns:
         Status 200 OK on successful deletion
     """
-    try:
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(resume_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid resume ID format"
-            )
-        
-        # Check that resume exists and belongs to current user
-        resume = await db.resumes.find_one({
-            "_id": object_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if not resume:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Resume not found or access denied"
-            )
-        
-        # If we have a file, also delete it from GridFS
-        if "file_id" in resume:
-            fs = AsyncIOMotorGridFSBucket(db)
-            try:
-                await fs.delete(ObjectId(resume["file_id"]))
-                logger.info(f"Resume file deleted from GridFS: {resume['file_id']}")
-            except Exception as e:
-                logger.warning(f"Failed to delete resume file from GridFS: {str(e)}")
-        
-        # Delete resume from database
-        result = await db.resumes.delete_one({"_id": object_id})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Resume not deleted"
-            )
-        
-        logger.info(f"Resume successfully deleted: {resume_id}")
-        return {"message": "Resume successfully deleted", "id": resume_id}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error deleting resume: {str(e)}")
+    # Delete resume if it exists and belongs to current user; only the
+    # request that actually deleted it releases the file reference
+    resume = await db.resumes.find_one_and_delete({
+        "_id": object_id,
+        "user_id": current_user.id
+    }, projection={"file_id": 1})
+    
+    if not resume:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error deleting resume: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resume not found or access denied"
         )
+    
+    # Deduplicated uploads share a GridFS file, which is deleted with its last resume
+    if "file_id" in resume:
+        await _release_resume_file(db, resume["file_id"])
+    
+    await _resume_list_changed(db, current_user.id)
+    # Job flows that use this resume are updated after the response
+    background_tasks.add_task(
+        update_job_flow_snapshots, db, "resume", str(object_id), empty_snapshot("resume")
+    )
+    
+    logger.info("Resume successfully deleted: %s", resume_id)
+    return {"message": "Resume successfully deleted", "id": resume_id}
 
 @router.patch("/{resume_id}/status", status_code=status.HTTP_200_OK)
 async def update_resume_status(
     resume_id: str,
     status_update: ResumeStatusUpdate,
+    object_id: ObjectId = Depends(_resume_id),
     current_user: User = Depends(get_current_user),
     db = Depends(get_db)
 ):
@@ -346,67 +545,41 @@ async def update_resume_status(
     Args:
         resume_id: Resume ID
         status_update: New status
+        object_id: Parsed resume ID
         current_user: Current user
         db: Database connection
         
     Returns:
         Updated resume
     """
-    try:
-        # Check ObjectId validity
-        try:
-            object_id = ObjectId(resume_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid resume ID format"
-            )
-        
-        # Check that resume exists and belongs to current user
-        resume = await db.resumes.find_one({
+    # Update status if resume exists and belongs to current user
+    updated_resume = await db.resumes.find_one_and_update(
+        {
             "_id": object_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if not resume:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Resume not found or access denied"
-            )
-        
-        # Update status
-        result = await db.resumes.update_one(
-            {"_id": object_id},
-            {"$set": {"status": status_update.status}}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Resume not updated"
-            )
-        
-        # Get updated resume
-        updated_resume = await db.resumes.find_one({"_id": object_id})
-        # Используем _id вместо id для правильной работы с моделью Pydantic
-        updated_resume["_id"] = str(updated_resume["_id"])
-        
-        return Resume(**updated_resume)
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error updating resume status: {str(e)}")
+            "user_id": current_user.id
+        },
+        {"$set": {"status": status_update.status, "updated_at": utc_now()}},
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if updated_resume is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error updating resume status: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resume not found or access denied"
         )
+    await _resume_list_changed(db, current_user.id)
+    
+    # Используем _id вместо id для правильной работы с моделью Pydantic
+    updated_resume["_id"] = str(updated_resume["_id"])
+    
+    return Resume(**updated_resume)
 
 @router.post("/scoring", response_model=Resume)
 async def score_resume(
     request: ResumeScoringRequest,
     current_user: User = Depends(get_current_user),
-    db = Depends(get_db)
+    db = Depends(get_db),
+    claude_client: ClaudeClient = Depends(get_claude_client)
 ):
     """
     Analyze and score a resume based on multiple criteria.
@@ -415,75 +588,62 @@ async def score_resume(
         request: Request containing resume ID
         current_user: Current authenticated user
         db: Database connection
+        claude_client: Shared Claude client
         
     Returns:
         Resume with scoring analysis
     """
-    try:
-        # Validate ObjectId
-        try:
-            object_id = ObjectId(request.resume_id)
-        except:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid resume ID format"
-            )
-        
-        # Get resume from database
-        resume = await db.resumes.find_one({
-            "_id": object_id,
-            "user_id": str(current_user.id)
-        })
-        
-        if not resume:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Resume not found or access denied"
-            )
-        
-        # Get candidate data from resume
-        candidate_data = resume.get('candidate', {})
-        if not candidate_data:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No candidate data found in resume"
-            )
-        
-        # Analyze resume using Claude
-        claude_client = ClaudeClient()
-        scoring_result = await claude_client.analyze_resume(candidate_data)
-        
-        # Update resume with scoring results in MongoDB
-        update_result = await db.resumes.update_one(
-            {"_id": object_id},
-            {
-                "$set": {
-                    "scoring": scoring_result.get("scoring", {}),
-                    "feedback": scoring_result.get("feedback", {}),
-                    "updated_at": datetime.utcnow()
-                }
-            }
+    object_id = parse_object_id(request.resume_id, "Invalid resume ID format")
+    
+    # Get candidate data of the resume; the rest is not needed for scoring
+    resume = await db.resumes.find_one({
+        "_id": object_id,
+        "user_id": current_user.id
+    }, {"candidate": 1, "processing_status": 1})
+    
+    if not resume:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resume not found or access denied"
         )
-        
-        if update_result.modified_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to update resume with scoring results"
-            )
-        
-        # Get updated resume
-        updated_resume = await db.resumes.find_one({"_id": object_id})
-        
-        # Convert ObjectId to string for response
-        updated_resume['_id'] = str(updated_resume['_id'])
-        
-        return Resume(**updated_resume)
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error scoring resume: {str(e)}")
+    
+    # Get candidate data from resume
+    ensure_resume_processed(resume)
+    candidate_data = resume.get('candidate', {})
+    if not candidate_data:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error scoring resume: {str(e)}"
-        ) 
\ No newline at end of file
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No candidate data found in resume"
+        )
+    
+    # Analyze resume using Claude
+    scoring_result = await claude_client.analyze_resume(candidate_data)
+    
+    # Update resume with scoring results in MongoDB and get the updated document;
+    # candidate data is already in memory, so it is not sent back
+    updated_resume = await db.resumes.find_one_and_update(
+        {"_id": object_id, "user_id": current_user.id},
+        {
+            "$set": {
+                "scoring": scoring_result.get("scoring", {}),
+                "feedback": scoring_result.get("feedback", {}),
+                "updated_at": utc_now()
+            }
+        },
+        projection={"candidate": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if updated_resume is None:
+        # Deleted while it was being analyzed
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Resume not found or access denied"
+        )
+    await _resume_list_changed(db, current_user.id)
+    
+    # Convert ObjectId to string for response
+    updated_resume['_id'] = str(updated_resume['_id'])
+    updated_resume['candidate'] = candidate_data
+    
+    return Resume(**updated_resume)